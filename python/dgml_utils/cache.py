@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from dgml_utils.config import DEFAULT_SUBTREE_CACHE_SIZE
+
+# Pending writes to the persistent store are written in batches of this size
+_COMMIT_INTERVAL = 256
+
+# Version of the rendered text in persistent stores. Bump when the text segmentation renders for
+# the same subtree and options changes, so stores written before are cleared instead of serving it.
+SUBTREE_CACHE_FORMAT_VERSION = 1
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0  # lookups answered from memory or the persistent store
+    misses: int = 0  # lookups that had to be computed
+    evictions: int = 0  # entries dropped from memory to stay under max_entries
+
+
+class SubtreeCache:
+    """
+    Content addressed cache of rendered subtree text (chunk text, simplified XML or table text),
+    keyed by the canonical subtree hashes from SubtreeHasher together with the rendering options,
+    so boilerplate clauses repeated across documents are only rendered once.
+
+    Recently used entries are kept in memory up to max_entries. If a path is given, entries are
+    also persisted to a SQLite database there and shared with later runs and worker processes,
+    in batches written in short transactions (and on flush or close). A store written with another
+    SUBTREE_CACHE_FORMAT_VERSION is cleared when opened.
+    The cache is safe to share between threads, and pickles to just its settings (so each worker
+    process gets its own in-memory entries over the same persistent store).
+
+    >>> cache = SubtreeCache(max_entries=2)
+    >>> cache.put(b'a', 'A'); cache.put(b'b', 'B'); cache.get(b'a')
+    'A'
+    >>> cache.put(b'c', 'C'); cache.get(b'b') is None
+    True
+    >>> cache.stats
+    CacheStats(hits=1, misses=1, evictions=1)
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_SUBTREE_CACHE_SIZE, path: Optional[Union[str, Path]] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.stats = CacheStats()
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending: Dict[bytes, str] = {}  # written to the persistent store in the next batch
+        if path is not None:
+            # Transactions are begun explicitly, see _write_pending
+            self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute("CREATE TABLE IF NOT EXISTS subtrees (key BLOB PRIMARY KEY, value TEXT NOT NULL)")
+            if self._format_version() != SUBTREE_CACHE_FORMAT_VERSION:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    # Checked again under the write lock, in case another process cleared it meanwhile
+                    if self._format_version() != SUBTREE_CACHE_FORMAT_VERSION:
+                        self._db.execute("DELETE FROM subtrees")
+                        self._db.execute(f"PRAGMA user_version = {SUBTREE_CACHE_FORMAT_VERSION}")
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+
+    def _format_version(self) -> int:
+        """Format version of the persistent store, kept in the SQLite user version (0 if never set)."""
+        assert self._db is not None
+        return self._db.execute("PRAGMA user_version").fetchone()[0]
+
+    def _remember(self, key: bytes, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def get(self, key: bytes) -> Optional[str]:
+        """The cached value for the given key, or None (counted as a miss) if it isn't cached."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            elif key in self._pending:
+                value = self._pending[key]
+                self._remember(key, value)
+            elif self._db is not None:
+                row = self._db.execute("SELECT value FROM subtrees WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = row[0]
+                    self._remember(key, value)
+
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+            return value
+
+    def put(self, key: bytes, value: str):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._pending[key] = value
+                if len(self._pending) >= _COMMIT_INTERVAL:
+                    self._write_pending()
+
+    def _write_pending(self):
+        """
+        Writes the pending entries to the persistent store in one short transaction. The write lock
+        is taken up front (rather than on the first insert), so a connection waiting for it doesn't
+        hold a read lock that keeps the connection writing (e.g. in another worker process) from
+        committing.
+        """
+        assert self._db is not None
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.executemany("INSERT OR REPLACE INTO subtrees (key, value) VALUES (?, ?)", self._pending.items())
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._pending.clear()
+
+    def flush(self):
+        """Writes pending entries to the persistent store, if any."""
+        with self._lock:
+            if self._db is not None and self._pending:
+                self._write_pending()
+
+    def close(self):
+        """Flushes and closes the persistent store. The in-memory entries remain usable."""
+        self.flush()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self):
+        self.flush()
+        return {"max_entries": self.max_entries, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,5 +1,6 @@
 import sys
 import typer
+import zipfile
 
 from pathlib import Path
 
@@ -15,7 +16,7 @@ def prettyprint(
         file_okay=True,
         dir_okay=False,
         resolve_path=True,
-        help="DGML file to pretty print",
+        help="DGML file (optionally gzip or zstd compressed), or zip archive of DGML files, to pretty print",
     ),
     include_xml_tags: bool = False,
 ):
@@ -23,14 +24,17 @@ def prettyprint(
     Pretty prints the given DGML
     """
 
-    from dgml_utils.segmentation import get_chunks_str
+    from dgml_utils.segmentation import get_chunks_file, iter_archive_chunks
 
-    # Read contents of dgml file
-    with open(dgml, "r", encoding="utf-8") as file:
-        dgml_str = file.read()
+    if zipfile.is_zipfile(dgml):
+        for name, archive_chunks in iter_archive_chunks(dgml, include_xml_tags=include_xml_tags):
+            typer.echo(f"# {name}")
+            typer.echo("\n".join([chunk.text for chunk in archive_chunks]))
+        return
 
-    chunks = get_chunks_str(
-        dgml=dgml_str,
+    # Parse straight from the file so the document is never decoded to a string first
+    chunks = get_chunks_file(
+        source=dgml,
         include_xml_tags=include_xml_tags,
         parent_hierarchy_levels=0,
     )
@@ -1,14 +1,25 @@
 from enum import Enum
 
-
 TABLE_NAME = "{http://www.w3.org/1999/xhtml}table"
+TABLE_HEAD_NAME = "{http://www.w3.org/1999/xhtml}thead"
+TABLE_HEADER_CELL_NAME = "{http://www.w3.org/1999/xhtml}th"
 STRUCTURE_KEY = "structure"
 STYLE_KEY = "style"
 
+# Chunk.metadata keys for fingerprints, as hex digests
+CONTENT_FINGERPRINT_KEY = "content_fingerprint"  # the chunk's own content (text, tags and structure)
+FINGERPRINT_KEY = "fingerprint"  # content, parent content and options: changes iff the chunk needs re-embedding
+OPTIONS_FINGERPRINT_KEY = "options_fingerprint"  # segmentation options that affect chunk text
+
+# Chunk.metadata keys for near-duplicate IDs, as "<document id>/<chunk index>"
+CHUNK_ID_KEY = "chunk_id"  # the chunk's own ID
+CANONICAL_ID_KEY = "canonical_id"  # the ID of the canonical chunk of its near-duplicate group
+
 DEFAULT_MIN_TEXT_LENGTH = 8  # Default min string length threshold for determining small chunks
 DEFAULT_MAX_TEXT_LENGTH = 1024 * 8  # Default max string length cap on returned chunks
 
 DEFAULT_SUBCHUNK_TABLES = False
+DEFAULT_TABLE_ROW_CHUNKS = False  # Split tables too long for one chunk into groups of whole rows, with repeated headers
 
 DEFAULT_TABLE_AS_TEXT_FORMAT = "grid"  # should be a valid format for the tabulate library
 DEFAULT_TABLE_AS_TEXT_CELL_MAX_WIDTH = 64
@@ -16,7 +27,26 @@ DEFAULT_TABLE_AS_TEXT_CELL_MAX_WIDTH = 64
 DEFAULT_WHITESPACE_NORMALIZE_TEXT = True
 DEFAULT_INCLUDE_XML_TAGS = False
 
+# Keep libxml2's limits on tree depth and text node size, which protect against untrusted input. Trusted documents
+# that exceed them (e.g. very deeply nested or with huge text nodes) can be parsed with huge_tree=True.
+DEFAULT_XML_PARSER_HUGE_TREE = False
+DEFAULT_XML_PARSER_REMOVE_BLANK_TEXT = False  # Keep whitespace-only text nodes so mixed content text is unchanged
+DGML_ARCHIVE_MEMBER_SUFFIXES = (".xml", ".xml.gz", ".xml.zst")  # Zip archive members read as DGML documents
+
 DEFAULT_PARENT_HIERARCHY_LEVELS = 0
+DEFAULT_EXPORT_BATCH_SIZE = 1024  # Rows per record batch when exporting chunks to Arrow/Parquet
+
+DEFAULT_PARALLEL_WORKERS = None  # Worker processes for segmenting top-level sections in parallel (None or 1 is serial)
+DEFAULT_MEMORY_BUDGET = None  # Max estimated bytes of finished chunks kept in memory before spilling to disk
+DEFAULT_FINGERPRINT_CHUNKS = False  # Add content fingerprints to Chunk.metadata for downstream caches
+DEFAULT_SUBTREE_CACHE_SIZE = 4096  # Rendered subtrees kept in memory by a SubtreeCache
+DEFAULT_DOCUMENT_CACHE_BYTES = 512 * 1024 * 1024  # Max estimated bytes of parsed documents kept by a DocumentCache
+
+DEFAULT_SHINGLE_SIZE = 5  # Characters per shingle when computing MinHash signatures of chunk text
+DEFAULT_MINHASH_PERMUTATIONS = 128  # Signature length, split into LSH bands of equal size
+DEFAULT_LSH_BANDS = 16  # 16 bands of 8 rows make chunks with ~0.7+ similarity likely candidates
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.8  # Min estimated Jaccard similarity of shingles for a near-duplicate
+DEFAULT_MINHASH_BATCH_SIZE = 1024  # Chunks signed together in one vectorized batch
 DEFAULT_SKIP_TAGS = ["chunk"]  # chunks that are skipped in the parent hierarchy and also not included inline in XML
 
 
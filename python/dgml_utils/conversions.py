@@ -1,4 +1,6 @@
 import textwrap
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 from lxml import etree
 from tabulate import tabulate
 
@@ -9,6 +11,8 @@ from dgml_utils.config import (
     DEFAULT_WHITESPACE_NORMALIZE_TEXT,
     DEFAULT_MAX_TEXT_LENGTH,
     NAMESPACES,
+    TABLE_HEAD_NAME,
+    TABLE_HEADER_CELL_NAME,
     TABLE_NAME,
 )
 
@@ -66,15 +70,121 @@ def xhtml_table_to_text(
     for tr in node.xpath(".//xhtml:tr", namespaces=NAMESPACES):
         cells = []
         for td_node in tr.xpath(".//xhtml:td", namespaces=NAMESPACES):
-            cell_text = text_node_to_text(td_node, whitespace_normalize=whitespace_normalize)
-            cell_text = "\n".join(textwrap.wrap(cell_text, cell_max_width))
-            cells.append(cell_text)
+            cells.append(_cell_text(td_node, whitespace_normalize, cell_max_width))
 
         rows.append(cells)
 
     return tabulate(rows, tablefmt=format)
 
 
+def _cell_text(cell, whitespace_normalize: bool, cell_max_width: int) -> str:
+    cell_text = text_node_to_text(cell, whitespace_normalize=whitespace_normalize)
+    return "\n".join(textwrap.wrap(cell_text, cell_max_width))
+
+
+def _is_header_row(tr) -> bool:
+    """True if the row is in the table head, or all its cells are header cells."""
+    if tr.getparent() is not None and tr.getparent().tag == TABLE_HEAD_NAME:
+        return True
+    cells = tr.xpath(".//xhtml:td|.//xhtml:th", namespaces=NAMESPACES)
+    return bool(cells) and all(cell.tag == TABLE_HEADER_CELL_NAME for cell in cells)
+
+
+@dataclass
+class TableRowGroup:
+    rows: List  # tr nodes of the group
+    header_rows: List  # tr nodes of the header rows repeated at the top of the group (if any)
+    text: str  # the header and group rows rendered as a table
+
+
+def xhtml_table_row_groups(
+    node,
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    whitespace_normalize=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
+    format=DEFAULT_TABLE_AS_TEXT_FORMAT,
+    cell_max_width=DEFAULT_TABLE_AS_TEXT_CELL_MAX_WIDTH,
+) -> List[TableRowGroup]:
+    """
+    Splits an HTML table into groups of consecutive whole rows that each render to formatted text
+    under max_text_length, with the leading header rows (in the table head, or made of header
+    cells) repeated at the top of every group. A table that fits has nothing to split, so no
+    groups are rendered or returned for it (render it with xhtml_table_to_text instead).
+
+    Row lengths are estimated up front from column widths over the whole table, which is an
+    upper bound for the narrower columns of any group, so each group is rendered only once.
+    A group can still be too long if a single row (with the headers) is, or if tabulate aligns
+    numbers wider than their text. Header rows are only repeated if they take up to half the limit.
+
+    >>> table = etree.XML('<table xmlns="http://www.w3.org/1999/xhtml"><thead><tr><th>Name</th></tr></thead>'
+    ...                   '<tr><td>Alice</td></tr><tr><td>Bob</td></tr><tr><td>Carol</td></tr></table>')
+    >>> groups = xhtml_table_row_groups(table, max_text_length=70)
+    >>> [len(group.rows) for group in groups]
+    [2, 1]
+    >>> print(groups[1].text)
+    +-------+
+    | Name  |
+    +-------+
+    | Carol |
+    +-------+
+    >>> xhtml_table_row_groups(table)
+    []
+    """
+    if node.tag != TABLE_NAME:
+        raise Exception("Please provide an XHTML table node for conversion.")
+
+    rows = node.xpath(".//xhtml:tr", namespaces=NAMESPACES)
+    cells = [
+        [
+            _cell_text(cell, whitespace_normalize, cell_max_width)
+            for cell in tr.xpath(".//xhtml:td|.//xhtml:th", namespaces=NAMESPACES)
+        ]
+        for tr in rows
+    ]
+
+    # Column widths and row heights (in lines) over the whole table
+    widths: List[int] = []
+    heights = []
+    for row_cells in cells:
+        height = 1
+        for column, cell_text in enumerate(row_cells):
+            lines = cell_text.split("\n")
+            if column == len(widths):
+                widths.append(0)
+            widths[column] = max(widths[column], *(len(line) for line in lines))
+            height = max(height, len(lines))
+        heights.append(height)
+
+    # Each line is "| " + cells joined by " | " + " |" and a newline, each row is followed by a rule line
+    line_length = sum(widths) + 3 * len(widths) + 2
+    row_lengths = [(height + 1) * line_length for height in heights]
+
+    header_count = 0
+    while header_count < len(rows) and _is_header_row(rows[header_count]):
+        header_count += 1
+    header_length = sum(row_lengths[:header_count])
+    repeat_headers = header_length <= max_text_length // 2
+
+    def group(start: int, end: int, with_headers: bool) -> TableRowGroup:
+        headers = list(range(header_count)) if with_headers else []
+        text = tabulate([cells[i] for i in headers] + cells[start:end], tablefmt=format)
+        return TableRowGroup(rows=rows[start:end], header_rows=[rows[i] for i in headers], text=text)
+
+    if header_count == len(rows) or line_length + sum(row_lengths) <= max_text_length:
+        return []
+
+    groups = []
+    start = header_count
+    length = line_length + header_length  # the top rule and the headers
+    for end in range(header_count, len(rows)):
+        if end > start and length + row_lengths[end] > max_text_length:
+            groups.append(group(start, end, with_headers=repeat_headers or not groups))
+            start = end
+            length = line_length + (header_length if repeat_headers else 0)
+        length += row_lengths[end]
+    groups.append(group(start, len(rows), with_headers=repeat_headers or not groups))
+    return groups
+
+
 def xml_nth_ancestor(
     node,
     n: int,
@@ -111,35 +221,113 @@ def xml_nth_ancestor(
     >>> clean_tag(ancestor)
     'orphan'
     """
-    if n <= 0 or node is None:
-        return node
+    return XmlAncestorFinder(
+        max_text_length=max_text_length, whitespace_normalize_text=whitespace_normalize_text
+    ).nth_ancestor(node, n, skip_tags=skip_tags)
 
-    filtered_ancestors = []
-    if node is not None:
-        all_ancestors = [anc for anc in node.xpath("ancestor::*")]
-        all_ancestors.reverse()  # start from parent up, not root down
-        if all_ancestors:
-            for anc in all_ancestors:
-                if skip_tags and clean_tag(anc) in skip_tags:
-                    continue
-                ancestor_text_length = len(
-                    simplified_xml(
-                        anc,
-                        whitespace_normalize_text=whitespace_normalize_text,
-                        skip_tags=skip_tags,
-                    )
-                )
-                if ancestor_text_length <= max_text_length:
-                    node = anc
-                    filtered_ancestors.append(anc)
-                else:
-                    break  # Stop walking ancestor chain if max text length is exceeded
-
-            for i, ancestor in enumerate(filtered_ancestors):
-                if i + 1 == n:
-                    return ancestor
-
-    return node
+
+def _non_whitespace_length(text: Optional[str]) -> int:
+    return len("".join(text.split())) if text else 0
+
+
+class XmlAncestorFinder:
+    """
+    Finds nth ancestors like xml_nth_ancestor for many nodes of one document, without rendering
+    the same ancestors again for every node.
+
+    The number of non-whitespace text characters under each node is a lower bound on the length
+    of its simplified XML, and is summed bottom-up once per node. Ancestors over the max text
+    length by that bound are never rendered, and rendered lengths are memoized, so only ancestors
+    that are about max_text_length or smaller are ever rendered, once each.
+
+    >>> root = etree.XML("<root><parent><skip><child>Some text</child></skip></parent></root>")
+    >>> finder = XmlAncestorFinder(max_text_length=45)
+    >>> clean_tag(finder.nth_ancestor(root.find('.//child'), 2, skip_tags=['skip']))
+    'parent'
+    """
+
+    def __init__(self, max_text_length=DEFAULT_MAX_TEXT_LENGTH, whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT):
+        self.max_text_length = max_text_length
+        self.whitespace_normalize_text = whitespace_normalize_text
+        self._content_lengths: Dict = {}  # non-whitespace text characters in each subtree, without its tail
+        self._xml_lengths: Dict = {}  # (node, skip tags) -> simplified XML length
+        self._next_ancestors: Dict = {}  # (node, skip tags) -> nearest ancestor without a skip tag, or None
+
+    @property
+    def entries(self) -> int:
+        """Number of memoized lengths and ancestors."""
+        return len(self._content_lengths) + len(self._xml_lengths) + len(self._next_ancestors)
+
+    def _content_length(self, node) -> int:
+        cached = self._content_lengths.get(node)
+        if cached is not None:
+            return cached
+
+        # Post-order walk that doesn't descend into subtrees counted before
+        stack = [(node, False)]
+        while stack:
+            element, children_done = stack.pop()
+            if element in self._content_lengths:
+                continue
+            if not children_done:
+                stack.append((element, True))
+                stack.extend((child, False) for child in element if isinstance(child.tag, str))
+                continue
+
+            length = _non_whitespace_length(element.text)
+            for child in element:
+                length += self._content_lengths.get(child, 0) + _non_whitespace_length(child.tail)
+            self._content_lengths[element] = length
+
+        return self._content_lengths[node]
+
+    def _next_ancestor(self, node, skip_tags: Optional[tuple]):
+        """The nearest ancestor without a skip tag, jumping over runs of skipped ancestors memoized before."""
+        skipped = []
+        ancestor = node.getparent()
+        while ancestor is not None and skip_tags and clean_tag(ancestor) in skip_tags:
+            key = (ancestor, skip_tags)
+            if key in self._next_ancestors:
+                ancestor = self._next_ancestors[key]
+                break
+            skipped.append(key)
+            ancestor = ancestor.getparent()
+
+        for key in skipped:
+            self._next_ancestors[key] = ancestor
+        return ancestor
+
+    def _fits(self, node, skip_tags) -> bool:
+        """True if the simplified XML of the node is at most max_text_length long."""
+        if self._content_length(node) + _non_whitespace_length(node.tail) > self.max_text_length:
+            return False
+
+        key = (node, skip_tags)
+        length = self._xml_lengths.get(key)
+        if length is None:
+            length = self._xml_lengths[key] = len(
+                simplified_xml(node, whitespace_normalize_text=self.whitespace_normalize_text, skip_tags=skip_tags)
+            )
+        return length <= self.max_text_length
+
+    def nth_ancestor(self, node, n: int, skip_tags=DEFAULT_SKIP_TAGS):
+        """Same as xml_nth_ancestor with this finder's max text length and whitespace normalization."""
+        if n <= 0 or node is None:
+            return node
+
+        skip_tags = tuple(skip_tags) if skip_tags else None
+        found = 0
+        ancestor = self._next_ancestor(node, skip_tags)  # from parent up
+        while ancestor is not None:
+            if not self._fits(ancestor, skip_tags):
+                break  # Stop walking ancestor chain if max text length is exceeded
+
+            node = ancestor
+            found += 1
+            if found == n:
+                break
+            ancestor = self._next_ancestor(ancestor, skip_tags)
+        return node
 
 
 def simplified_node(node):
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import json
+import random
+import zlib
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from dgml_utils.config import (
+    CANONICAL_ID_KEY,
+    CHUNK_ID_KEY,
+    DEFAULT_LSH_BANDS,
+    DEFAULT_MINHASH_BATCH_SIZE,
+    DEFAULT_MINHASH_PERMUTATIONS,
+    DEFAULT_NEAR_DUPLICATE_THRESHOLD,
+    DEFAULT_SHINGLE_SIZE,
+)
+from dgml_utils.models import Chunk
+
+try:
+    import numpy as np  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - numpy is optional, signatures are computed in pure Python without it
+    np = None
+
+NEAR_DUPLICATE_INDEX_FORMAT_VERSION = 1
+
+# Largest prime below 2**32. Shingle hashes are reduced mod this prime, so (a * x + b) for
+# a, b, x below it always fits in an unsigned 64-bit integer.
+_MERSENNE_PRIME = 4294967291
+
+# Upper bound on shingles hashed in one vectorized step (times the number of permutations)
+_MAX_VECTORIZED_SHINGLES = 1 << 15
+
+
+def text_shingles(text: str, shingle_size=DEFAULT_SHINGLE_SIZE) -> Set[int]:
+    """
+    Hashes of the overlapping character shingles of the given text, after lowercasing and
+    whitespace normalization. Text shorter than a shingle is a single shingle.
+
+    >>> len(text_shingles('Hello  World')), len(text_shingles('Hi')), text_shingles('')
+    (7, 1, set())
+    """
+    text = " ".join(text.lower().split())
+    if len(text) <= shingle_size:
+        return {zlib.crc32(text.encode("utf-8")) % _MERSENNE_PRIME} if text else set()
+    encoded = [text[i : i + shingle_size].encode("utf-8") for i in range(len(text) - shingle_size + 1)]
+    return {zlib.crc32(shingle) % _MERSENNE_PRIME for shingle in encoded}
+
+
+def _permutations(num_permutations: int, seed: int) -> Tuple[List[int], List[int]]:
+    rng = random.Random(seed)
+    a = [rng.randrange(1, _MERSENNE_PRIME) for _ in range(num_permutations)]
+    b = [rng.randrange(0, _MERSENNE_PRIME) for _ in range(num_permutations)]
+    return a, b
+
+
+def minhash_signatures(
+    texts: Sequence[str],
+    num_permutations=DEFAULT_MINHASH_PERMUTATIONS,
+    shingle_size=DEFAULT_SHINGLE_SIZE,
+    seed=1,
+) -> List[List[int]]:
+    """
+    MinHash signatures of the given texts. With numpy installed, all the shingles of a batch are
+    hashed under every permutation in a few vectorized steps, otherwise this falls back to pure
+    Python with identical results. Empty texts get a signature of all _MERSENNE_PRIME.
+
+    >>> first, second, third = minhash_signatures(['The quick brown fox', 'the quick  brown fox', 'Something else'])
+    >>> first == second, first == third, len(first)
+    (True, False, 128)
+    """
+    a, b = _permutations(num_permutations, seed)
+    shingle_sets = [text_shingles(text, shingle_size) for text in texts]
+    signatures: List[List[int]] = [[_MERSENNE_PRIME] * num_permutations for _ in texts]
+
+    non_empty = [i for i, shingles in enumerate(shingle_sets) if shingles]
+    if np is None:
+        for i in non_empty:
+            shingles = shingle_sets[i]
+            signatures[i] = [min((ai * x + bi) % _MERSENNE_PRIME for x in shingles) for ai, bi in zip(a, b)]
+        return signatures
+
+    a_column = np.array(a, dtype=np.uint64)[:, None]
+    b_column = np.array(b, dtype=np.uint64)[:, None]
+
+    start = 0
+    while start < len(non_empty):
+        # Take as many texts as fit in one vectorized step (at least one)
+        end = start + 1
+        total = len(shingle_sets[non_empty[start]])
+        while end < len(non_empty) and total + len(shingle_sets[non_empty[end]]) <= _MAX_VECTORIZED_SHINGLES:
+            total += len(shingle_sets[non_empty[end]])
+            end += 1
+
+        group = non_empty[start:end]
+        lengths = [len(shingle_sets[i]) for i in group]
+        offsets = np.cumsum([0] + lengths[:-1])
+        shingles = np.fromiter((x for i in group for x in shingle_sets[i]), dtype=np.uint64, count=total)
+
+        hashed = (a_column * shingles[None, :] + b_column) % np.uint64(_MERSENNE_PRIME)
+        minimums = np.minimum.reduceat(hashed, offsets, axis=1)
+        for column, i in enumerate(group):
+            signatures[i] = minimums[:, column].tolist()
+        start = end
+
+    return signatures
+
+
+def signature_similarity(ours: Sequence[int], theirs: Sequence[int]) -> float:
+    """
+    Estimated Jaccard similarity of the shingles behind two MinHash signatures.
+
+    >>> signature_similarity([1, 2, 3, 4], [1, 2, 0, 4])
+    0.75
+    """
+    return sum(x == y for x, y in zip(ours, theirs)) / len(ours)
+
+
+class NearDuplicateIndex:
+    """
+    Groups near-duplicate chunks (repeated headers, signature blocks, standard clauses) by the
+    MinHash signatures of their text, with an LSH index over the signatures so each new chunk is
+    only compared to the few canonical chunks sharing a band with it.
+
+    The first chunk of each group is its canonical representative. Adding chunks tags each one
+    with its own ID as metadata[CHUNK_ID_KEY] and its representative's ID as metadata[CANONICAL_ID_KEY],
+    so only chunks whose two IDs are equal need to be embedded. Only canonical chunks are kept
+    in the index, which can be saved and loaded to keep adding documents incrementally.
+
+    >>> index = NearDuplicateIndex()
+    >>> chunks = [Chunk(tag='p', text=t, xml='', structure='p', xpath='') for t in [
+    ...     'This Agreement shall be governed by the laws of the State of Washington.',
+    ...     'Confidential Information means all non-public information.',
+    ...     'This Agreement shall be governed by the laws of the State of  Washington']]
+    >>> index.add(chunks, document_id='nda')
+    ['nda/0', 'nda/1', 'nda/0']
+    >>> chunks[2].metadata
+    {'chunk_id': 'nda/2', 'canonical_id': 'nda/0'}
+    """
+
+    def __init__(
+        self,
+        num_permutations=DEFAULT_MINHASH_PERMUTATIONS,
+        bands=DEFAULT_LSH_BANDS,
+        threshold=DEFAULT_NEAR_DUPLICATE_THRESHOLD,
+        shingle_size=DEFAULT_SHINGLE_SIZE,
+        seed=1,
+    ):
+        if num_permutations % bands:
+            raise ValueError(f"The number of permutations ({num_permutations}) must be a multiple of the bands ({bands})")
+
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.documents = 0  # documents added so far, used for default document IDs
+        self._rows = num_permutations // bands
+        self._signatures: Dict[str, List[int]] = {}  # canonical chunk ID -> signature
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        """Number of canonical chunks (groups of near-duplicates) in the index."""
+        return len(self._signatures)
+
+    def _band_keys(self, signature: List[int]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self._rows : (band + 1) * self._rows])
+
+    def _insert(self, chunk_id: str, signature: List[int]):
+        self._signatures[chunk_id] = signature
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(chunk_id)
+
+    def find(self, signature: List[int]) -> Optional[str]:
+        """The ID of the most similar canonical chunk at or above the threshold, if any."""
+        candidates: Set[str] = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        best_id, best_similarity = None, 0.0
+        for candidate in sorted(candidates):  # sorted so ties are broken the same way every time
+            similarity = signature_similarity(signature, self._signatures[candidate])
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_id, best_similarity = candidate, similarity
+        return best_id
+
+    def add(
+        self,
+        chunks: Iterable[Chunk],
+        document_id: Optional[str] = None,
+        batch_size=DEFAULT_MINHASH_BATCH_SIZE,
+    ) -> List[str]:
+        """
+        Adds the chunks of one document (e.g. from get_chunks or iter_chunks), tagging their
+        metadata in place, and returns their canonical IDs. Chunk IDs are the document ID and
+        the position of the chunk in it, with a running document number if no ID is given.
+
+        Note that chunks read back from a SpillingChunkList are copies, so tag those while
+        iterating over iter_chunks instead.
+        """
+        if document_id is None:
+            document_id = str(self.documents)
+        self.documents += 1
+
+        canonical_ids: List[str] = []
+        chunk_iterator = iter(chunks)
+        while True:
+            batch = list(islice(chunk_iterator, batch_size))
+            if not batch:
+                break
+
+            signatures = minhash_signatures(
+                [chunk.text for chunk in batch],
+                num_permutations=self.num_permutations,
+                shingle_size=self.shingle_size,
+                seed=self.seed,
+            )
+            for chunk, signature in zip(batch, signatures):
+                chunk_id = f"{document_id}/{len(canonical_ids)}"
+                canonical_id = self.find(signature)
+                if canonical_id is None:
+                    self._insert(chunk_id, signature)
+                    canonical_id = chunk_id
+
+                chunk.metadata[CHUNK_ID_KEY] = chunk_id
+                chunk.metadata[CANONICAL_ID_KEY] = canonical_id
+                canonical_ids.append(canonical_id)
+
+        return canonical_ids
+
+    def save(self, path: Union[str, Path]):
+        """Writes the index (settings and canonical signatures) as JSON."""
+        data = {
+            "version": NEAR_DUPLICATE_INDEX_FORMAT_VERSION,
+            "num_permutations": self.num_permutations,
+            "bands": self.bands,
+            "threshold": self.threshold,
+            "shingle_size": self.shingle_size,
+            "seed": self.seed,
+            "documents": self.documents,
+            "signatures": self._signatures,
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional[NearDuplicateIndex]:
+        """Reads an index written by save(). Returns None if it is missing or from another format version."""
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != NEAR_DUPLICATE_INDEX_FORMAT_VERSION:
+            return None
+
+        index = cls(
+            num_permutations=data["num_permutations"],
+            bands=data["bands"],
+            threshold=data["threshold"],
+            shingle_size=data["shingle_size"],
+            seed=data["seed"],
+        )
+        index.documents = data["documents"]
+        for chunk_id, signature in data["signatures"].items():
+            index._insert(chunk_id, signature)
+        return index
@@ -0,0 +1,180 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Sized, Tuple, Union
+
+from dgml_utils.cache import CacheStats
+from dgml_utils.config import DEFAULT_DOCUMENT_CACHE_BYTES, DEFAULT_XML_PARSER_HUGE_TREE
+from dgml_utils.conversions import XmlAncestorFinder
+from dgml_utils.hashing import SubtreeHasher, hash_values
+from dgml_utils.locators import XPathLocator
+from dgml_utils.parsing import parse_dgml
+
+# Rough bytes of memory per element of a parsed tree (libxml2 node, attributes and lxml bookkeeping),
+# on top of its text, used to estimate the size of cached documents
+_ELEMENT_OVERHEAD_BYTES = 256
+
+# Rough bytes of memory per memoized entry of an annotation (dict or set slot, the lxml proxy of the
+# element it is keyed by and a small value), used to estimate the size of annotated documents
+_ANNOTATION_ENTRY_BYTES = 160
+
+
+def estimated_tree_size(root) -> int:
+    """
+    Estimated bytes of memory taken by the parsed tree under root: a fixed overhead per
+    element plus its text, tail and attribute values.
+
+    >>> from lxml import etree
+    >>> estimated_tree_size(etree.XML('<a x="1">text<b/>tail</a>')) == 2 * _ELEMENT_OVERHEAD_BYTES + 9
+    True
+    """
+    size = 0
+    for element in root.iter():
+        size += _ELEMENT_OVERHEAD_BYTES + len(element.text or "") + len(element.tail or "")
+        if isinstance(element.tag, str):
+            size += sum(len(value) for value in element.attrib.values())
+    return size
+
+
+def _annotation_entries(annotation) -> int:
+    """Number of memoized entries in an annotation: a memo (locator, hasher or ancestor finder), dict or set."""
+    if isinstance(annotation, (XPathLocator, SubtreeHasher, XmlAncestorFinder)):
+        return annotation.entries
+    return len(annotation) if isinstance(annotation, Sized) else 0
+
+
+class ParsedDocument:
+    """
+    A parsed DGML document together with the annotations segmentation computes for it that don't
+    depend on segmentation options (xpaths, subtree hashes, which nodes have structural descendants,
+    page spans, ancestor lengths for each max text length). Pass it to get_chunks or iter_chunks
+    instead of a node to segment the same document repeatedly, e.g. with different options,
+    without parsing it or computing any of those again.
+
+    The document must not be changed while it is in use. Annotations are computed on first use,
+    once, and are safe to share between threads segmenting the document at the same time.
+    Annotations grow as more of the document is segmented, and so does its estimated size.
+    """
+
+    def __init__(self, root, tree_size: Optional[int] = None):
+        self.root = root
+        self.tree_size = estimated_tree_size(root) if tree_size is None else tree_size  # estimated bytes in memory
+        self.locator = XPathLocator()
+        self.hasher = SubtreeHasher()
+        self._annotations: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, source: Union[str, bytes, Path], huge_tree=DEFAULT_XML_PARSER_HUGE_TREE) -> "ParsedDocument":
+        """Parses a (possibly compressed) DGML file path, bytes or string, as parse_dgml does."""
+        return cls(parse_dgml(source, huge_tree=huge_tree))
+
+    def annotation(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """The annotation stored under the given key, computed (once) on first use."""
+        value = self._annotations.get(key)
+        if value is None:
+            with self._lock:
+                value = self._annotations.get(key)
+                if value is None:
+                    value = self._annotations[key] = compute()
+        return value
+
+    @property
+    def annotations_size(self) -> int:
+        """Estimated bytes of memory taken by the annotations computed so far."""
+        annotations = [self.locator, self.hasher, *self._annotations.values()]
+        entries = sum(_annotation_entries(annotation) for annotation in annotations)
+        return entries * _ANNOTATION_ENTRY_BYTES + self.locator.xpaths_length
+
+    @property
+    def size(self) -> int:
+        """Estimated bytes of memory taken by the parsed tree and its annotations."""
+        return self.tree_size + self.annotations_size
+
+
+class DocumentCache:
+    """
+    Process level LRU cache of parsed, annotated documents for long lived services that segment the
+    same documents again and again. Paths are keyed by their resolved path, modification time and
+    size, so changed files are parsed again; bytes and strings are keyed by a hash of their content.
+
+    Documents are evicted least recently used first to keep their total estimated size under
+    max_bytes (documents larger than that on their own are parsed but not cached). Cached documents
+    grow as they are segmented and annotated, so their sizes are estimated again on every get. The
+    cache is safe to share between threads.
+
+    >>> cache = DocumentCache()
+    >>> document = cache.get(b'<a structure="p">text</a>')
+    >>> cache.get(b'<a structure="p">text</a>') is document
+    True
+    >>> cache.stats
+    CacheStats(hits=1, misses=1, evictions=0)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_DOCUMENT_CACHE_BYTES, huge_tree=DEFAULT_XML_PARSER_HUGE_TREE):
+        self.max_bytes = max_bytes
+        self.huge_tree = huge_tree
+        self.stats = CacheStats()
+        self.size = 0  # total estimated bytes of the cached documents, as of the last get
+        self._documents: "OrderedDict[Tuple, ParsedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(source: Union[str, bytes, Path]) -> Tuple:
+        if isinstance(source, Path):
+            stat = os.stat(source)
+            return ("path", str(source.resolve()), stat.st_mtime_ns, stat.st_size)
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        return ("content", hash_values(source))
+
+    def get(self, source: Union[str, bytes, Path]) -> ParsedDocument:
+        """
+        The parsed document for the given DGML file path, bytes or string, parsing it on a miss.
+        Documents are parsed outside the lock, so misses in other threads aren't held up.
+        """
+        key = self._key(source)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self.stats.hits += 1
+                self._evict()
+                return document
+            self.stats.misses += 1
+
+        document = ParsedDocument.parse(source, huge_tree=self.huge_tree)
+        if document.size > self.max_bytes:
+            return document
+
+        with self._lock:
+            cached = self._documents.get(key)
+            if cached is not None:
+                # Another thread parsed the same document meanwhile, keep the one already shared
+                return cached
+            self._documents[key] = document
+            self._evict()
+        return document
+
+    def _evict(self):
+        """Estimates the size of the cached documents again and evicts them until it is under max_bytes."""
+        sizes = [document.size for document in self._documents.values()]
+        self.size = sum(sizes)
+        for size in sizes:
+            if self.size <= self.max_bytes:
+                break
+            self._documents.popitem(last=False)
+            self.size -= size
+            self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, source: Union[str, bytes, Path]) -> bool:
+        return self._key(source) in self._documents
@@ -0,0 +1,172 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, List, Optional, Union
+
+from dgml_utils.config import DEFAULT_EXPORT_BATCH_SIZE
+from dgml_utils.models import Chunk
+
+# pyarrow comes with the optional arrow extra, so may be missing where the package is type checked
+if TYPE_CHECKING:
+    import pyarrow as pa  # pyright: ignore[reportMissingImports]
+
+EXPORT_FORMATS = ["parquet", "arrow"]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow  # pyright: ignore[reportMissingImports]
+    except ImportError as e:
+        raise ImportError(
+            "Exporting chunks requires pyarrow. Install it with `pip install pyarrow` or `pip install dgml-utils[arrow]`."
+        ) from e
+    return pyarrow
+
+
+def chunk_schema() -> "pa.Schema":
+    """
+    Arrow schema for exported chunks, one row per chunk.
+
+    parent_index is the row index of the parent when the parent is itself one of the exported
+    chunks (e.g. self-parents in structure hierarchy mode), otherwise null. parent_text is set
+    whenever the chunk has a parent.
+    """
+    pa = _import_pyarrow()
+    bbox_type = pa.struct(
+        [
+            ("left", pa.float64()),
+            ("top", pa.float64()),
+            ("right", pa.float64()),
+            ("bottom", pa.float64()),
+            ("page", pa.int32()),
+        ]
+    )
+    return pa.schema(
+        [
+            ("index", pa.int64()),
+            ("text", pa.string()),
+            ("xml", pa.string()),
+            ("tag", pa.string()),
+            ("structure", pa.string()),
+            ("xpath", pa.string()),
+            ("parent_index", pa.int64()),
+            ("parent_text", pa.string()),
+            ("bboxes", pa.list_(bbox_type)),
+        ]
+    )
+
+
+def iter_record_batches(
+    chunks: Iterable[Chunk],
+    batch_size=DEFAULT_EXPORT_BATCH_SIZE,
+) -> Iterator["pa.RecordBatch"]:
+    """
+    Converts chunks into Arrow record batches of up to batch_size rows, column by column.
+    Chunks are consumed lazily, so this streams from iter_chunks without holding all chunks.
+    """
+    pa = _import_pyarrow()
+    schema = chunk_schema()
+    bbox_type = schema.field("bboxes").type.value_type
+
+    batch: List[Chunk] = []
+    start_index = 0
+
+    def _to_record_batch() -> "pa.RecordBatch":
+        row_of_chunk = {id(chunk): start_index + i for i, chunk in enumerate(batch)}
+
+        parent_indexes: List[Optional[int]] = []
+        parent_texts: List[Optional[str]] = []
+        for chunk in batch:
+            parent = chunk.parent
+            parent_indexes.append(None if parent is None else row_of_chunk.get(id(parent)))
+            parent_texts.append(None if parent is None else parent.text)
+
+        # Build the bbox list column from flat child columns and offsets, not per-row dicts
+        offsets = [0]
+        lefts: List[float] = []
+        tops: List[float] = []
+        rights: List[float] = []
+        bottoms: List[float] = []
+        pages: List[Any] = []
+        for chunk in batch:
+            for bbox in chunk.bboxes:
+                lefts.append(bbox.left)
+                tops.append(bbox.top)
+                rights.append(bbox.right)
+                bottoms.append(bbox.bottom)
+                pages.append(bbox.page)
+            offsets.append(len(lefts))
+
+        bboxes = pa.ListArray.from_arrays(
+            pa.array(offsets, pa.int32()),
+            pa.StructArray.from_arrays(
+                [
+                    pa.array(lefts, pa.float64()),
+                    pa.array(tops, pa.float64()),
+                    pa.array(rights, pa.float64()),
+                    pa.array(bottoms, pa.float64()),
+                    pa.array(pages, pa.int32()),
+                ],
+                fields=list(bbox_type),
+            ),
+        )
+
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array(range(start_index, start_index + len(batch)), pa.int64()),
+                pa.array([chunk.text for chunk in batch], pa.string()),
+                pa.array([chunk.xml for chunk in batch], pa.string()),
+                pa.array([chunk.tag for chunk in batch], pa.string()),
+                pa.array([chunk.structure for chunk in batch], pa.string()),
+                pa.array([chunk.xpath for chunk in batch], pa.string()),
+                pa.array(parent_indexes, pa.int64()),
+                pa.array(parent_texts, pa.string()),
+                bboxes,
+            ],
+            schema=schema,
+        )
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield _to_record_batch()
+            start_index += len(batch)
+            batch = []
+
+    if batch:
+        yield _to_record_batch()
+
+
+def chunks_to_table(chunks: Iterable[Chunk], batch_size=DEFAULT_EXPORT_BATCH_SIZE) -> "pa.Table":
+    """Converts chunks into an in-memory Arrow table."""
+    pa = _import_pyarrow()
+    return pa.Table.from_batches(list(iter_record_batches(chunks, batch_size=batch_size)), schema=chunk_schema())
+
+
+def write_chunks(
+    chunks: Iterable[Chunk],
+    path: Union[str, Path],
+    format: str = "parquet",
+    batch_size=DEFAULT_EXPORT_BATCH_SIZE,
+) -> int:
+    """
+    Writes chunks to a Parquet file or an Arrow IPC file, one record batch at a time, so chunks
+    can be streamed straight from iter_chunks. Returns the number of chunks written.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}, expected one of {EXPORT_FORMATS}")
+
+    pa = _import_pyarrow()
+    schema = chunk_schema()
+    rows = 0
+    if format == "parquet":
+        import pyarrow.parquet as pq  # pyright: ignore[reportMissingImports]
+
+        with pq.ParquetWriter(str(path), schema) as writer:
+            for batch in iter_record_batches(chunks, batch_size=batch_size):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    else:
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in iter_record_batches(chunks, batch_size=batch_size):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    return rows
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import Collection, Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from dgml_utils.config import STRUCTURE_KEY, STYLE_KEY
+from dgml_utils.conversions import clean_tag
+from dgml_utils.models import BoundingBox
+
+PageSpan = Tuple[int, int]  # first and last page, inclusive
+
+
+def page_spans(node) -> Dict:
+    """
+    Summarizes the pages covered by every element under the given node (inclusive), in one
+    bottom-up pass over the tree. Pages come from the boundingBox entries in style attributes.
+    Elements without any page information under them are left out.
+
+    >>> root = etree.XML('<a><b style="boundingBox:{left: 1; top: 1; width: 1; height: 1; page: 2;}"/>'
+    ...                  '<c style="boundingBox:{left: 1; top: 1; width: 1; height: 1; page: 5;}"/><d/></a>')
+    >>> spans = page_spans(root)
+    >>> spans[root], spans[root[0]], root[2] in spans
+    ((2, 5), (2, 2), False)
+    """
+    spans: Dict = {}
+    for _, element in etree.iterwalk(node, events=("end",)):
+        if not isinstance(element.tag, str):
+            continue
+
+        span: Optional[PageSpan] = None
+        pages = [bbox.page for bbox in BoundingBox.from_style(element.attrib.get(STYLE_KEY)) if bbox.page is not None]
+        if pages:
+            span = (min(pages), max(pages))
+        for child in element:
+            child_span = spans.get(child)
+            if child_span:
+                span = child_span if span is None else (min(span[0], child_span[0]), max(span[1], child_span[1]))
+
+        if span:
+            spans[element] = span
+    return spans
+
+
+@dataclass
+class SegmentationFilter:
+    """
+    Restricts segmentation to part of a document. Filters are applied during traversal, so
+    subtrees that cannot match are pruned before any text is extracted or serialized.
+
+    :param root_xpath: Only segment the subtrees at this xpath (e.g. a Chunk.xpath), evaluated with the document's namespaces
+    :param page_range: Only keep chunks on these pages (first, last; inclusive). Subtrees without page information are kept.
+    :param include_structures: Only keep chunks whose structure attribute has one of these values
+    :param exclude_structures: Skip subtrees whose structure attribute has any of these values
+    :param include_tags: Only keep chunks that have, or are inside an element with, one of these clean tags
+    :param exclude_tags: Skip subtrees of elements with any of these clean tags
+    """
+
+    root_xpath: Optional[str] = None
+    page_range: Optional[PageSpan] = None
+    include_structures: Optional[Collection[str]] = None
+    exclude_structures: Optional[Collection[str]] = None
+    include_tags: Optional[Collection[str]] = None
+    exclude_tags: Optional[Collection[str]] = None
+
+    def roots(self, node) -> List:
+        """The nodes to segment under the given node, in document order and without nesting."""
+        if not self.root_xpath:
+            return [node]
+
+        namespaces = {prefix: uri for prefix, uri in node.nsmap.items() if prefix}
+        roots: List = []
+        for match in node.xpath(self.root_xpath, namespaces=namespaces):
+            if not isinstance(match, etree._Element):
+                continue
+            if roots and any(ancestor is roots[-1] for ancestor in match.iterancestors()):
+                continue  # already covered by the previous root
+            roots.append(match)
+        return roots
+
+    def prunes(self, node, spans: Optional[Dict] = None) -> bool:
+        """True if no chunk in the subtree of the given node can pass the filter."""
+        if self.exclude_structures and not set(node.attrib.get(STRUCTURE_KEY, "").split()).isdisjoint(self.exclude_structures):
+            return True
+        if self.exclude_tags and clean_tag(node) in self.exclude_tags:
+            return True
+        if self.page_range and spans is not None:
+            span = spans.get(node)
+            if span and (span[1] < self.page_range[0] or span[0] > self.page_range[1]):
+                return True
+        return False
+
+    def is_included_tag(self, node) -> bool:
+        """True if include_tags is not set or the node has one of its tags (descendants then inherit this)."""
+        return not self.include_tags or clean_tag(node) in self.include_tags
+
+    def matches(self, node) -> bool:
+        """True if the given chunk node passes the include filters (subtree pruning is checked separately)."""
+        if self.include_structures and set(node.attrib.get(STRUCTURE_KEY, "").split()).isdisjoint(self.include_structures):
+            return False
+        return True
@@ -0,0 +1,88 @@
+from hashlib import blake2b
+from typing import Dict, Optional
+
+from lxml import etree
+
+from dgml_utils.config import STRUCTURE_KEY
+
+HASH_DIGEST_SIZE = 16
+
+
+def hash_values(*values) -> bytes:
+    """
+    Hashes the given strings or bytes (None is treated as empty) into a fixed size digest.
+
+    >>> hash_values('a', 'bc') == hash_values('a', 'bc')
+    True
+    >>> hash_values('a', 'bc') == hash_values('ab', 'c')
+    False
+    """
+    h = blake2b(digest_size=HASH_DIGEST_SIZE)
+    for value in values:
+        if value is None:
+            value = b""
+        elif isinstance(value, str):
+            value = value.encode("utf-8")
+        h.update(len(value).to_bytes(8, "little"))
+        h.update(value)
+    return h.digest()
+
+
+def combine_fingerprints(*fingerprints: Optional[str]) -> str:
+    """
+    Combines hex fingerprints (in order) into one hex fingerprint.
+
+    >>> combine_fingerprints('ab', 'cd') == combine_fingerprints('cd', 'ab')
+    False
+    """
+    return hash_values(*fingerprints).hex()
+
+
+class SubtreeHasher:
+    """
+    Canonical content hashes of subtrees, from element local names, structure attributes and
+    text (including the tails of children), but not positions, namespaces or other attributes.
+    Identical clauses therefore hash the same wherever they appear, in any document.
+
+    Hashes are built bottom-up from the hashes of children and memoized, so hashing every
+    subtree of a document costs one pass over it.
+
+    >>> root = etree.XML('<r><a style="x" structure="p">Same <b>text</b></a><a structure="p">Same <b>text</b></a></r>')
+    >>> hasher = SubtreeHasher()
+    >>> hasher.hash(root[0]) == hasher.hash(root[1])
+    True
+    >>> hasher.hash(root[0]) == hasher.hash(root)
+    False
+    """
+
+    def __init__(self):
+        self._hashes: Dict = {}
+
+    @property
+    def entries(self) -> int:
+        """Number of memoized subtree hashes."""
+        return len(self._hashes)
+
+    def hash(self, node) -> bytes:
+        cached = self._hashes.get(node)
+        if cached is not None:
+            return cached
+
+        # Post-order walk that doesn't descend into subtrees hashed before
+        stack = [(node, False)]
+        while stack:
+            element, children_done = stack.pop()
+            if element in self._hashes:
+                continue
+            if not children_done:
+                stack.append((element, True))
+                stack.extend((child, False) for child in element if isinstance(child.tag, str))
+                continue
+
+            parts = [etree.QName(element).localname, element.attrib.get(STRUCTURE_KEY), element.text]
+            for child in element:
+                # Comments and processing instructions only contribute their tails, like in itertext
+                parts += [self._hashes[child] if isinstance(child.tag, str) else b"", child.tail]
+            self._hashes[element] = hash_values(*parts)
+
+        return self._hashes[node]
@@ -1,7 +1,11 @@
 from __future__ import annotations
+import sys
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 
+# Slotted dataclasses (smaller per-object memory) need Python 3.10+
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
 def merge_parents(ours: Optional[Chunk], theirs: Optional[Chunk]) -> Optional[Chunk]:
     """
@@ -61,7 +65,7 @@ def merge_tags(ours: str, theirs: str):
     return ours + " " + theirs if ours and theirs else ours or theirs
 
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class Chunk:
     tag: str
     text: str
@@ -105,10 +109,88 @@ class Chunk:
         )
 
 
+class ChunkBuilder:
+    """
+    Accumulates Chunks to be merged, and materializes a single Chunk equal to adding them all
+    together with Chunk.__add__, without building the intermediate Chunks, metadata dicts, bbox
+    lists and concatenated strings along the way.
+
+    >>> builder = ChunkBuilder(Chunk(tag='lim', text='1.', xml='<lim>1.</lim>', structure='lim', xpath='/a/b[1]'))
+    >>> builder.append_text('\\n')
+    >>> builder.add(Chunk(tag='p', text='Item', xml='<p>Item</p>', structure='p', xpath='/a/b[2]'))
+    >>> builder.text_length
+    8
+    >>> builder.build()
+    Chunk(tag='lim p', text='1.\\n Item', xml='<lim>1.</lim> <p>Item</p>', structure='lim p', xpath='/a/b[1]', parent=None, bboxes=[], metadata={})
+    """
+
+    __slots__ = ("tag", "texts", "xmls", "structures", "xpath", "parent", "bboxes", "metadata", "text_length")
+
+    def __init__(self, chunk: Chunk):
+        self.tag = chunk.tag
+        self.texts = [chunk.text]
+        self.xmls = [chunk.xml]
+        self.structures = [chunk.structure]  # pieces of the merged structure, joined when built
+        self.xpath = chunk.xpath
+        self.parent = chunk.parent
+        self.bboxes = list(chunk.bboxes)
+        self.metadata = dict(chunk.metadata)
+        self.text_length = len(chunk.text)  # length of the materialized text
+
+    def add(self, other: Chunk):
+        """Appends another Chunk, with the same semantics as Chunk.__add__."""
+        self.tag = merge_tags(self.tag, other.tag)
+        self.texts.append(other.text)
+        self.xmls.append(other.xml)
+        self._add_structure(other.structure)
+        self.xpath = merge_xpaths(self.xpath, other.xpath)
+        self.parent = merge_parents(self.parent, other.parent)
+        self.bboxes.extend(other.bboxes)
+        self.metadata.update(other.metadata)
+        self.text_length += len(other.text) + 1
+
+    def _add_structure(self, structure: str):
+        # Same as structure = (structure + " " + other).strip(), without copying the whole structure
+        # for every chunk added. Only the ends are stripped, so only the last piece can change.
+        structures = self.structures
+        last = structures.pop().lstrip() if len(structures) == 1 else structures.pop()
+        if not last.strip():
+            # The structure so far is blank, so it is replaced
+            structures.append(structure.strip())
+        elif structure.strip():
+            structures += [last, " " + structure.rstrip()]
+        else:
+            structures.append(last.rstrip())
+
+    @property
+    def structure(self) -> str:
+        return "".join(self.structures)
+
+    def append_text(self, suffix: str):
+        """Appends a suffix to the accumulated text, without a separating space."""
+        self.texts[-1] += suffix
+        self.text_length += len(suffix)
+
+    def build(self, text_separator: str = " ") -> Chunk:
+        """Materializes the merged Chunk, optionally joining the texts with a different one character separator."""
+        return Chunk(
+            tag=self.tag,
+            text=text_separator.join(self.texts),
+            xml=" ".join(self.xmls),
+            structure=self.structure,
+            xpath=self.xpath,
+            parent=self.parent,
+            bboxes=self.bboxes,
+            metadata=self.metadata,
+        )
+
+
 class BoundingBox:
     """The origin (0,0) for these bounding boxes is in the top, left
     of the image/page."""
 
+    __slots__ = ("left", "top", "right", "bottom", "page")
+
     def __init__(self, left: float, top: float, right: float, bottom: float, page: Optional[int] = None):
         self.left: float = left
         self.top: float = top
@@ -0,0 +1,209 @@
+import gzip
+import io
+import threading
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Tuple, Union
+
+from lxml import etree
+
+from dgml_utils.config import (
+    DEFAULT_XML_PARSER_HUGE_TREE,
+    DEFAULT_XML_PARSER_REMOVE_BLANK_TEXT,
+    DGML_ARCHIVE_MEMBER_SUFFIXES,
+)
+
+DGMLSource = Union[str, bytes, Path, IO[bytes]]  # a str is DGML content
+DGMLFile = Union[str, Path, IO[bytes]]  # a str is a file path
+
+_thread_local = threading.local()
+
+# Magic bytes at the start of compressed input
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+def get_parser(
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    remove_blank_text=DEFAULT_XML_PARSER_REMOVE_BLANK_TEXT,
+) -> etree.XMLParser:
+    """
+    Returns a reusable XML parser for the calling thread, configured for (untrusted) DGML input.
+
+    Parsers are not thread-safe, so one instance is kept per thread and per configuration. Entity
+    resolution, DTD loading and network access are always disabled, and libxml2's limits on tree
+    depth and text node size stay on unless huge_tree is set.
+
+    :param huge_tree: Disable libxml2 security limits on tree depth and text node size, for very large trusted documents only
+    :param remove_blank_text: Drop whitespace-only text nodes between elements (changes the text of mixed content)
+    :return: An lxml XMLParser instance
+
+    >>> get_parser() is get_parser()
+    True
+    >>> get_parser() is get_parser(remove_blank_text=True)
+    False
+    """
+    parsers: Dict[Tuple[bool, bool], etree.XMLParser] = getattr(_thread_local, "parsers", None)  # type: ignore
+    if parsers is None:
+        parsers = _thread_local.parsers = {}
+
+    key = (huge_tree, remove_blank_text)
+    parser = parsers.get(key)
+    if parser is None:
+        parser = etree.XMLParser(
+            huge_tree=huge_tree,
+            remove_blank_text=remove_blank_text,
+            resolve_entities=False,
+            load_dtd=False,
+            no_network=True,
+        )
+        parsers[key] = parser
+    return parser
+
+
+def _import_zstandard():
+    try:
+        import zstandard  # pyright: ignore[reportMissingImports]
+    except ImportError as e:
+        raise ImportError(
+            "Reading zstd compressed DGML requires zstandard. "
+            "Install it with `pip install zstandard` or `pip install dgml-utils[zstd]`."
+        ) from e
+    return zstandard
+
+
+def _peek(stream: IO[bytes], size: int) -> Tuple[IO[bytes], bytes]:
+    """The first bytes of the given stream without consuming them (buffering the stream if needed)."""
+    if not hasattr(stream, "peek"):
+        if stream.seekable():
+            position = stream.tell()
+            head = stream.read(size)
+            stream.seek(position)
+            return stream, head
+        stream = io.BufferedReader(stream)  # type: ignore
+    return stream, stream.peek(size)[:size]  # type: ignore
+
+
+@contextmanager
+def _open_binary(source: DGMLFile) -> Iterator[IO[bytes]]:
+    """Opens the given path, or passes through the given binary file object (leaving it open)."""
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as file:
+            yield file
+    else:
+        yield source
+
+
+@contextmanager
+def open_dgml(source: DGMLFile) -> Iterator[IO[bytes]]:
+    """
+    Opens a DGML file path or binary file object for reading, transparently decompressing gzip
+    and zstd (detected from their magic bytes, not the file name). The returned stream decompresses
+    incrementally as it is read, so compressed documents are never held in memory in full.
+    Zstd needs the optional zstandard package. Zip archives hold several documents, read those
+    with iter_archive_members instead.
+
+    >>> with open_dgml(io.BytesIO(gzip.compress(b'<a>text</a>'))) as stream:
+    ...     stream.read()
+    b'<a>text</a>'
+    """
+    with _open_binary(source) as stream:
+        stream, head = _peek(stream, 4)
+        if head.startswith(_GZIP_MAGIC):
+            with gzip.GzipFile(fileobj=stream, mode="rb") as decompressed:
+                yield decompressed  # type: ignore
+        elif head.startswith(_ZSTD_MAGIC):
+            with _import_zstandard().ZstdDecompressor().stream_reader(stream, closefd=False) as decompressed:
+                yield decompressed
+        elif head.startswith(_ZIP_MAGIC):
+            raise ValueError("Zip archives hold several DGML documents, read them with iter_archive_members")
+        else:
+            yield stream
+
+
+def is_compressed(path: Union[str, Path]) -> bool:
+    """Whether the given file starts with gzip, zstd or zip magic bytes."""
+    with open(path, "rb") as file:
+        head = file.read(4)
+    return head.startswith((_GZIP_MAGIC, _ZSTD_MAGIC, _ZIP_MAGIC))
+
+
+def archive_members(archive: Union[str, Path, zipfile.ZipFile]) -> List[str]:
+    """
+    Names of the DGML documents in a zip archive (e.g. a docset export), in archive order.
+    Members ending in .xml, optionally compressed (.xml.gz or .xml.zst), count as documents.
+    """
+    if not isinstance(archive, zipfile.ZipFile):
+        with zipfile.ZipFile(archive) as zip_file:
+            return archive_members(zip_file)
+
+    return [
+        info.filename
+        for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and info.filename.lower().endswith(DGML_ARCHIVE_MEMBER_SUFFIXES)
+    ]
+
+
+def iter_archive_members(
+    archive: Union[str, Path],
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    remove_blank_text=DEFAULT_XML_PARSER_REMOVE_BLANK_TEXT,
+) -> Iterator[Tuple[str, etree._Element]]:
+    """
+    Yields the name and parsed root node of each DGML document in a zip archive, in archive order.
+    Members are decompressed as they are parsed, without extracting them first.
+    """
+    with zipfile.ZipFile(archive) as zip_file:
+        for name in archive_members(zip_file):
+            yield name, parse_archive_member(zip_file, name, huge_tree=huge_tree, remove_blank_text=remove_blank_text)
+
+
+def parse_archive_member(
+    archive: zipfile.ZipFile,
+    name: str,
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    remove_blank_text=DEFAULT_XML_PARSER_REMOVE_BLANK_TEXT,
+) -> etree._Element:
+    """Parses one DGML document (optionally gzip or zstd compressed itself) from an open zip archive."""
+    with archive.open(name) as member:
+        return parse_dgml(member, huge_tree=huge_tree, remove_blank_text=remove_blank_text)
+
+
+def parse_dgml(
+    source: DGMLSource,
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    remove_blank_text=DEFAULT_XML_PARSER_REMOVE_BLANK_TEXT,
+):
+    """
+    Parses DGML from a string, raw bytes, a file path or a binary file object and returns the root node.
+
+    Bytes, paths and file objects are handed to libxml2 as-is so the document is never decoded to
+    a Python string first; the encoding is taken from the XML declaration (or BOM). Gzip and zstd
+    compressed bytes, files and file objects are decompressed as they are streamed into the parser.
+
+    :param source: DGML as str or bytes, a Path to a (possibly compressed) DGML file, or a binary file-like object
+    :return: Root lxml node of the parsed document
+
+    >>> root = parse_dgml(b'<?xml version="1.0" encoding="utf-8"?><a>caf\\xc3\\xa9</a>')
+    >>> root.text
+    'café'
+    >>> parse_dgml('<a><b>text</b></a>').find('b').text
+    'text'
+    >>> etree.tostring(parse_dgml('<!DOCTYPE a [<!ENTITY e "expanded">]><a>&e;</a>'))
+    b'<a>&e;</a>'
+    """
+    parser = get_parser(huge_tree=huge_tree, remove_blank_text=remove_blank_text)
+
+    if isinstance(source, (bytes, bytearray)) and source.startswith((_GZIP_MAGIC, _ZSTD_MAGIC)):
+        source = io.BytesIO(source)
+    elif isinstance(source, (str, bytes, bytearray)):
+        return etree.fromstring(source, parser)
+    if isinstance(source, Path) and not is_compressed(source):
+        # Let libxml2 read uncompressed files itself
+        return etree.parse(str(source), parser).getroot()
+    with open_dgml(source) as stream:
+        return etree.parse(stream, parser).getroot()
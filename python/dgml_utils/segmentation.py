@@ -1,29 +1,53 @@
+import multiprocessing
+import pickle
+import zipfile
+from collections import deque
 from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
 from lxml import etree
-from typing import List, Optional
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
+from dgml_utils.cache import SubtreeCache
 from dgml_utils.config import (
+    CONTENT_FINGERPRINT_KEY,
+    DEFAULT_FINGERPRINT_CHUNKS,
     DEFAULT_HIERARCHY_MODE,
     DEFAULT_INCLUDE_XML_TAGS,
     DEFAULT_MIN_TEXT_LENGTH,
     DEFAULT_SUBCHUNK_TABLES,
+    DEFAULT_TABLE_ROW_CHUNKS,
     DEFAULT_WHITESPACE_NORMALIZE_TEXT,
     DEFAULT_PARENT_HIERARCHY_LEVELS,
     DEFAULT_MAX_TEXT_LENGTH,
+    DEFAULT_MEMORY_BUDGET,
+    DEFAULT_PARALLEL_WORKERS,
+    DEFAULT_XML_PARSER_HUGE_TREE,
+    FINGERPRINT_KEY,
+    OPTIONS_FINGERPRINT_KEY,
     STRUCTURE_KEY,
     STYLE_KEY,
     TABLE_NAME,
     HierarchyMode,
 )
+from dgml_utils.documents import ParsedDocument
 from dgml_utils.conversions import (
     clean_tag,
     simplified_xml,
     text_node_to_text,
+    TableRowGroup,
+    XmlAncestorFinder,
+    xhtml_table_row_groups,
     xhtml_table_to_text,
-    xml_nth_ancestor,
 )
-from dgml_utils.locators import xpath
-from dgml_utils.models import BoundingBox, Chunk
+from dgml_utils.filters import SegmentationFilter, page_spans
+from dgml_utils.hashing import SubtreeHasher, combine_fingerprints, hash_values
+from dgml_utils.locators import XPathLocator, xpath
+from dgml_utils.models import BoundingBox, Chunk, ChunkBuilder
+from dgml_utils.parsing import DGMLFile, archive_members, parse_archive_member, parse_dgml
+from dgml_utils.storage import SpillingChunkList
 
 
 def is_descendant_of_structural(node) -> bool:
@@ -41,175 +65,795 @@ def is_structural(node) -> bool:
 
 def has_structural_children(node) -> bool:
     """True if node has any descendents (at any depth) with the structure attribute set."""
-    return len(node.findall(f".//*[@{STRUCTURE_KEY}]")) > 0
+    return node.find(f".//*[@{STRUCTURE_KEY}]") is not None
 
 
 def is_force_prepend_chunk(node) -> bool:
     return node is not None and node.attrib.get(STRUCTURE_KEY) in ["lim"]
 
 
-def get_chunks(
+def _nodes_with_structural_children(node) -> Set:
+    """
+    All nodes under the given node (inclusive) that have structural descendants, in one bottom-up
+    pass, so has_structural_children doesn't have to search the subtree of every node visited.
+    """
+    nodes = set()
+    for _, element in etree.iterwalk(node, events=("end",)):
+        for child in element:
+            if child in nodes or (isinstance(child.tag, str) and STRUCTURE_KEY in child.attrib):
+                nodes.add(element)
+                break
+    return nodes
+
+
+def _is_chunk_leaf(node, sub_chunk_tables: bool, is_descendant_of_structural: bool, has_structural_children: bool) -> bool:
+    is_table_leaf_node = node.tag == TABLE_NAME and not sub_chunk_tables
+    is_text_leaf_node = is_structural(node) and not has_structural_children
+    is_structure_orphaned_node = is_descendant_of_structural and not has_structural_children
+    return is_table_leaf_node or is_text_leaf_node or is_structure_orphaned_node
+
+
+def is_chunk_leaf(node, sub_chunk_tables=DEFAULT_SUBCHUNK_TABLES) -> bool:
+    """True if node is emitted as chunk(s) itself, rather than traversed into."""
+    return _is_chunk_leaf(node, sub_chunk_tables, is_descendant_of_structural(node), has_structural_children(node))
+
+
+@dataclass
+class _SegmentationOptions:
+    """Options that affect how leaf nodes are turned into chunks, passed to section workers."""
+
+    max_text_length: int
+    whitespace_normalize_text: bool
+    sub_chunk_tables: bool
+    include_xml_tags: bool
+    parent_hierarchy_levels: int
+    hierarchy_mode: HierarchyMode
+    filters: Optional[SegmentationFilter]
+    subtree_cache: Optional[SubtreeCache] = None
+    fingerprint_chunks: bool = DEFAULT_FINGERPRINT_CHUNKS
+    table_row_chunks: bool = DEFAULT_TABLE_ROW_CHUNKS
+
+
+# Bump when chunk text for the same content and options changes, so old fingerprints don't match
+_FINGERPRINT_VERSION = "1"
+
+
+def _options_fingerprint(min_text_length: int, options: _SegmentationOptions) -> str:
+    """Fingerprint of the options that affect chunk text (not how or where segmentation runs)."""
+    return combine_fingerprints(
+        _FINGERPRINT_VERSION,
+        str(min_text_length),
+        str(options.max_text_length),
+        str(options.whitespace_normalize_text),
+        str(options.sub_chunk_tables),
+        str(options.include_xml_tags),
+        str(options.parent_hierarchy_levels),
+        options.hierarchy_mode.name,
+        repr(options.filters),
+        # Only included when on, so fingerprints from before the option existed still match
+        *(["table_row_chunks"] if options.table_row_chunks else []),
+    )
+
+
+def _set_content_fingerprint(chunk: Chunk, merged_chunks: List[Chunk]):
+    """Sets the content fingerprint of a chunk merged from the given chunks, if they all have one."""
+    fingerprints = [merged.metadata.get(CONTENT_FINGERPRINT_KEY) for merged in merged_chunks]
+    if fingerprints and all(fingerprints):
+        chunk.metadata[CONTENT_FINGERPRINT_KEY] = combine_fingerprints(*fingerprints)
+        # Merged metadata may carry the fingerprints of finished chunks, which don't apply here
+        chunk.metadata.pop(FINGERPRINT_KEY, None)
+        chunk.metadata.pop(OPTIONS_FINGERPRINT_KEY, None)
+
+
+def _set_fingerprints(chunk: Chunk, options_fingerprint: str):
+    """Sets the fingerprint of a finished chunk (with its parent set), from its content, its parent's content and the options."""
+    parent_fingerprint = chunk.parent.metadata.get(CONTENT_FINGERPRINT_KEY) if chunk.parent is not None else None
+    chunk.metadata[OPTIONS_FINGERPRINT_KEY] = options_fingerprint
+    chunk.metadata[FINGERPRINT_KEY] = combine_fingerprints(
+        options_fingerprint,
+        chunk.metadata.get(CONTENT_FINGERPRINT_KEY),
+        parent_fingerprint,
+    )
+
+
+# The chunks built from one leaf node (split on max length), its structure mode ancestor chunk
+# if any, and whether it is force prepended to the chunk that follows it
+_LeafChunks = Tuple[List[Chunk], Optional[Chunk], bool]
+
+
+def _node_text(
     node,
-    min_text_length=DEFAULT_MIN_TEXT_LENGTH,
-    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
     whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
-    sub_chunk_tables=DEFAULT_SUBCHUNK_TABLES,
+    subtree_cache: Optional[SubtreeCache] = None,
+    hasher: Optional[SubtreeHasher] = None,
+) -> str:
+    """
+    Renders the text of the given node, looking it up in the subtree cache first if one is given.
+    Rendered text only depends on the subtree content (and the node's tail in simplified XML), not
+    on its position, so it can be reused for identical subtrees in any document.
+    """
+    if include_xml_tags:
+        mode = "xml"
+    elif node.tag == TABLE_NAME:
+        mode = "table"
+    else:
+        mode = "text"
+
+    key = None
+    if subtree_cache is not None:
+        hasher = hasher or SubtreeHasher()
+        tail = node.tail if mode == "xml" else None
+        key = hash_values(hasher.hash(node), mode, str(whitespace_normalize_text), tail)
+        cached_text = subtree_cache.get(key)
+        if cached_text is not None:
+            return cached_text
+
+    if mode == "xml":
+        node_text = simplified_xml(
+            node,
+            whitespace_normalize_text=whitespace_normalize_text,
+        )
+    elif mode == "table":
+        node_text = xhtml_table_to_text(node, whitespace_normalize=whitespace_normalize_text)
+    else:
+        node_text = text_node_to_text(node, whitespace_normalize=whitespace_normalize_text)
+
+    if subtree_cache is not None and key is not None:
+        subtree_cache.put(key, node_text)
+    return node_text
+
+
+def _build_chunks(
+    node,
     include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
-    parent_hierarchy_levels=DEFAULT_PARENT_HIERARCHY_LEVELS,
-    hierarchy_mode=DEFAULT_HIERARCHY_MODE,
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
+    subtree_cache: Optional[SubtreeCache] = None,
+    hasher: Optional[SubtreeHasher] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    locator: Optional[XPathLocator] = None,
+    table_row_chunks=DEFAULT_TABLE_ROW_CHUNKS,
 ) -> List[Chunk]:
-    """Returns all structural chunks in the given node, as xml chunks."""
-    final_chunks: List[Chunk] = []
-    prepended_chunk: Optional[Chunk] = None
+    """
+    Builds chunks from the given node, splitting on the given max length to ensure
+    all the returned chunks as less than the given max length.
+
+    Only the rendered text comes from the subtree cache (if given), the xml, xpath and
+    bounding boxes depend on where the node is and are always taken from the node itself.
+
+    If fingerprint_chunks is set, each chunk gets a content fingerprint from the subtree hash of
+    the node and the index of the split, without hashing the chunk text again.
 
-    def _build_chunks(
+    If table_row_chunks is set, tables (as text) too long for one chunk are split into groups of
+    whole rows instead (see _build_table_row_chunks).
+    """
+    if table_row_chunks and node.tag == TABLE_NAME and not include_xml_tags:
+        row_groups = xhtml_table_row_groups(
+            node, max_text_length=max_text_length, whitespace_normalize=whitespace_normalize_text
+        )
+        if len(row_groups) > 1:
+            return _build_table_row_chunks(node, row_groups, max_text_length, hasher, fingerprint_chunks, locator)
+
+    # Tables that fit (no groups) or have a single row too long for any group are rendered as without
+    # table_row_chunks, which leaves out header (th) cells that the row groups include
+    node_text = _node_text(
         node,
-        include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
-        max_text_length=DEFAULT_MAX_TEXT_LENGTH,
-        whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
-    ) -> List[Chunk]:
-        """
-        Builds chunks from the given node, splitting on the given max length to ensure
-        all the returned chunks as less than the given max length.
-        """
-        if include_xml_tags:
-            node_text = simplified_xml(
-                node,
-                whitespace_normalize_text=whitespace_normalize_text,
+        include_xml_tags=include_xml_tags,
+        whitespace_normalize_text=whitespace_normalize_text,
+        subtree_cache=subtree_cache,
+        hasher=hasher,
+    )
+
+    node_text_splits = [node_text[i : i + max_text_length] for i in range(0, len(node_text), max_text_length)]
+
+    subtree_hash = None
+    if fingerprint_chunks:
+        subtree_hash = (hasher or SubtreeHasher()).hash(node)
+
+    # Everything but the text is the same for all splits, so only serialize the node once
+    tag = clean_tag(node)
+    node_xml = etree.tostring(node, encoding="unicode")
+    structure = (node.attrib.get(STRUCTURE_KEY) or "").strip()
+    node_xpath = locator.xpath(node) if locator else xpath(node)
+    bboxes = BoundingBox.from_style(node.attrib.get(STYLE_KEY))
+
+    chunks = []
+    for split_index, text in enumerate(node_text_splits):
+        chunk = Chunk(
+            tag=tag,
+            text=text,
+            xml=node_xml,
+            structure=structure,
+            xpath=node_xpath,
+            bboxes=list(bboxes),
+        )
+        if subtree_hash is not None:
+            # Simplified XML also renders the tail of the node
+            tail = node.tail if include_xml_tags else None
+            chunk.metadata[CONTENT_FINGERPRINT_KEY] = hash_values(subtree_hash, tail, str(split_index)).hex()
+        chunks.append(chunk)
+    return chunks
+
+
+def _bboxes_by_page(bboxes: List[BoundingBox]) -> List[BoundingBox]:
+    """The union of the given bounding boxes on each page, in order of first appearance."""
+    unions: Dict[Optional[int], BoundingBox] = {}
+    for bbox in bboxes:
+        unions[bbox.page] = unions[bbox.page].union(bbox) if bbox.page in unions else bbox.clone()
+    return list(unions.values())
+
+
+def _build_table_row_chunks(
+    table,
+    row_groups: List[TableRowGroup],
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    hasher: Optional[SubtreeHasher] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    locator: Optional[XPathLocator] = None,
+) -> List[Chunk]:
+    """
+    Builds one chunk per group of table rows (with the table's header rows repeated in each), so
+    no row is split across chunks. Each chunk's xml is the table with just its header and group
+    rows, its xpath is that of the first row of the group, and its bounding boxes are those of
+    the group rows, joined on each page. Groups still over the max length (e.g. a single huge
+    row) are split on the max length like any other chunk.
+
+    If fingerprint_chunks is set, fingerprints come from the subtree hashes of the rows.
+    """
+    tag = clean_tag(table)
+    structure = (table.attrib.get(STRUCTURE_KEY) or "").strip()
+    table_bboxes = BoundingBox.from_style(table.attrib.get(STYLE_KEY))
+    hasher = (hasher or SubtreeHasher()) if fingerprint_chunks else None
+
+    chunks = []
+    for group in row_groups:
+        row_hashes = [hasher.hash(row) for row in group.header_rows + group.rows] if hasher else None
+
+        group_table = etree.Element(table.tag, attrib=dict(table.attrib), nsmap=table.nsmap)
+        for row in group.header_rows + group.rows:
+            row_copy = deepcopy(row)
+            row_copy.tail = None
+            group_table.append(row_copy)
+        group_xml = etree.tostring(group_table, encoding="unicode")
+
+        first_row = group.rows[0] if group.rows else table
+        group_xpath = locator.xpath(first_row) if locator else xpath(first_row)
+        row_bboxes = [bbox for row in group.rows for bbox in BoundingBox.from_style(row.attrib.get(STYLE_KEY))]
+        bboxes = _bboxes_by_page(row_bboxes) if row_bboxes else table_bboxes
+
+        text_splits = [group.text[i : i + max_text_length] for i in range(0, len(group.text), max_text_length)]
+        for split_index, text in enumerate(text_splits):
+            chunk = Chunk(
+                tag=tag,
+                text=text,
+                xml=group_xml,
+                structure=structure,
+                xpath=group_xpath,
+                bboxes=[bbox.clone() for bbox in bboxes],
+            )
+            if row_hashes is not None:
+                chunk.metadata[CONTENT_FINGERPRINT_KEY] = hash_values(*row_hashes, str(split_index)).hex()
+            chunks.append(chunk)
+    return chunks
+
+
+class _TraversalMemo:
+    """
+    Memoized state for building the chunks of many leaf nodes of one document, so work for
+    subtrees and ancestors shared by many leaves (xpaths, subtree hashes, ancestor lengths and
+    ancestor chunks) is done once instead of once per leaf.
+    """
+
+    def __init__(self, options: _SegmentationOptions, document: Optional[ParsedDocument] = None):
+        self.hasher: Optional[SubtreeHasher] = None
+        if options.subtree_cache is not None or options.fingerprint_chunks:
+            self.hasher = document.hasher if document else SubtreeHasher()
+
+        def ancestor_finder():
+            return XmlAncestorFinder(
+                max_text_length=options.max_text_length,
+                whitespace_normalize_text=options.whitespace_normalize_text,
+            )
+
+        if document:
+            # Reuse what was memoized for this document before (with the same options for ancestors)
+            self.locator = document.locator
+            self.ancestor_finder = document.annotation(
+                ("ancestor_finder", options.max_text_length, options.whitespace_normalize_text), ancestor_finder
             )
-        elif node.tag == TABLE_NAME:
-            node_text = xhtml_table_to_text(node, whitespace_normalize=whitespace_normalize_text)
         else:
-            node_text = text_node_to_text(node, whitespace_normalize=whitespace_normalize_text)
-
-        node_text_splits = [node_text[i : i + max_text_length] for i in range(0, len(node_text), max_text_length)]
-
-        chunks = []
-        for text in node_text_splits:
-            chunks.append(
-                Chunk(
-                    tag=clean_tag(node),
-                    text=text,
-                    xml=etree.tostring(node, encoding="unicode"),
-                    structure=(node.attrib.get(STRUCTURE_KEY) or "").strip(),
-                    xpath=xpath(node),
-                    bboxes=BoundingBox.from_style(node.attrib.get(STYLE_KEY)),
-                )
+            self.locator = XPathLocator()
+            self.ancestor_finder = ancestor_finder()
+        # Ancestor chunks of the previous leaf, which are usually the same for the next leaf
+        self.ancestor_chunks: Dict = {}
+
+
+def _build_ancestor_chunk(node, options: _SegmentationOptions, memo: Optional[_TraversalMemo] = None) -> Optional[Chunk]:
+    """Builds the structure hierarchy mode parent for the given leaf node, if that mode is on."""
+    if options.hierarchy_mode != HierarchyMode.Structure or options.parent_hierarchy_levels <= 0:
+        # For window hierarchy mode, parents are set once all chunks are calculated
+        return None
+
+    memo = memo or _TraversalMemo(options)
+
+    # Try to use tree hierarchy directly from the node in structure hierarchy mode.
+    semantic_ancestor_node = memo.ancestor_finder.nth_ancestor(node, n=options.parent_hierarchy_levels)
+    structural_ancestor_node = memo.ancestor_finder.nth_ancestor(
+        node,
+        n=options.parent_hierarchy_levels,
+        skip_tags=None,  # don't skip anything
+    )
+
+    # We split the current chunk into sub-chunks if longer than max length,
+    # to avoid loss of text. However, if the ancestor is longer than max length
+    # what do we do? For now let's just pick the first ancestor (larger of)
+    # semantic or non-semantic but this could be lossy.
+    ancestor_chunks: Dict = {}
+    for ancestor_node in [semantic_ancestor_node, structural_ancestor_node]:
+        if ancestor_node not in ancestor_chunks:
+            ancestor_chunks[ancestor_node] = (
+                memo.ancestor_chunks.get(ancestor_node)
+                or _build_chunks(
+                    ancestor_node,
+                    include_xml_tags=options.include_xml_tags,
+                    max_text_length=options.max_text_length,
+                    whitespace_normalize_text=options.whitespace_normalize_text,
+                    subtree_cache=options.subtree_cache,
+                    hasher=memo.hasher,
+                    fingerprint_chunks=options.fingerprint_chunks,
+                    locator=memo.locator,
+                )[0]
             )
-        return chunks
+    memo.ancestor_chunks = ancestor_chunks
+
+    semantic_ancestor_chunk = ancestor_chunks[semantic_ancestor_node]
+    structural_ancestor_chunk = ancestor_chunks[structural_ancestor_node]
+    if len(semantic_ancestor_chunk.text) > len(structural_ancestor_chunk.text):
+        # Prefer the semantic ancestor if it is larger (normal case)
+        return semantic_ancestor_chunk
+    else:
+        # If we can get more context with a structural ancestor, take that instead
+        return structural_ancestor_chunk
 
-    def _traverse(node):
-        nonlocal prepended_chunk  # Access the variable from the outer scope
 
-        is_table_leaf_node = node.tag == TABLE_NAME and not sub_chunk_tables
-        is_text_leaf_node = is_structural(node) and not has_structural_children(node)
-        is_structure_orphaned_node = is_descendant_of_structural(node) and not has_structural_children(node)
+def _iter_leaves(
+    node,
+    options: _SegmentationOptions,
+    spans: Optional[Dict],
+    in_included_tag=False,
+    document: Optional[ParsedDocument] = None,
+) -> Iterator[_LeafChunks]:
+    """
+    Walks the tree under node in document order, yielding the chunks of every leaf node.
 
-        if is_table_leaf_node or is_text_leaf_node or is_structure_orphaned_node:
-            sub_chunks: List[Chunk] = _build_chunks(
+    Everything computed per node is memoized or carried down the walk (whether it is under a
+    structural node, which nodes have structural children, and see _TraversalMemo), so the
+    walk stays linear in the size of the tree however deep or wide it is. If node is part of the
+    given parsed document, what was memoized for the document before is reused.
+    """
+    filters = options.filters
+    memo = _TraversalMemo(options, document)
+    if document:
+        root = document.root
+        with_structural_children = document.annotation(
+            "with_structural_children", lambda: _nodes_with_structural_children(root)
+        )
+    else:
+        with_structural_children = _nodes_with_structural_children(node)
+    stack = [(node, in_included_tag, is_descendant_of_structural(node))]
+    while stack:
+        node, in_included_tag, under_structural = stack.pop()
+
+        if filters and isinstance(node.tag, str):
+            # Prune subtrees that can't match before doing any other work on them
+            if filters.prunes(node, spans):
+                continue
+            in_included_tag = in_included_tag or filters.is_included_tag(node)
+
+        if _is_chunk_leaf(node, options.sub_chunk_tables, under_structural, node in with_structural_children):
+            if filters and not (in_included_tag and filters.matches(node)):
+                continue
+
+            sub_chunks = _build_chunks(
                 node,
-                include_xml_tags=include_xml_tags,
-                max_text_length=max_text_length,
-                whitespace_normalize_text=whitespace_normalize_text,
+                include_xml_tags=options.include_xml_tags,
+                max_text_length=options.max_text_length,
+                whitespace_normalize_text=options.whitespace_normalize_text,
+                subtree_cache=options.subtree_cache,
+                hasher=memo.hasher,
+                fingerprint_chunks=options.fingerprint_chunks,
+                table_row_chunks=options.table_row_chunks,
+                locator=memo.locator,
             )
-            ancestor_chunk = None
-            if hierarchy_mode == HierarchyMode.Structure and parent_hierarchy_levels > 0:
-                # Try to use tree hierarchy directly from the node in structure hierarchy
-                # mode. For window hierarchy mode, we do this below once all chunks are
-                # calculated, so no parent set here.
-                semantic_ancestor_node = xml_nth_ancestor(
-                    node,
-                    n=parent_hierarchy_levels,
-                    max_text_length=max_text_length,
-                    whitespace_normalize_text=whitespace_normalize_text,
-                )
-                structural_ancestor_node = xml_nth_ancestor(
-                    node,
-                    n=parent_hierarchy_levels,
-                    max_text_length=max_text_length,
-                    whitespace_normalize_text=whitespace_normalize_text,
-                    skip_tags=None,  # don't skip anything
-                )
-
-                # We split the current chunk into sub-chunks if longer than max length,
-                # to avoid loss of text. However, if the ancestor is longer than max length
-                # what do we do? For now let's just pick the first ancestor (larger of)
-                # semantic or non-semantic but this could be lossy.
-                semantic_ancestor_chunk = _build_chunks(
-                    semantic_ancestor_node,
-                    include_xml_tags=include_xml_tags,
-                    max_text_length=max_text_length,
-                    whitespace_normalize_text=whitespace_normalize_text,
-                )[0]
-                structural_ancestor_chunk = _build_chunks(
-                    structural_ancestor_node,
-                    include_xml_tags=include_xml_tags,
-                    max_text_length=max_text_length,
-                    whitespace_normalize_text=whitespace_normalize_text,
-                )[0]
-                if len(semantic_ancestor_chunk.text) > len(structural_ancestor_chunk.text):
-                    # Prefer the semantic ancestor if it is larger (normal case)
-                    ancestor_chunk = semantic_ancestor_chunk
-                else:
-                    # If we can get more context with a structural ancestor, take that instead
-                    ancestor_chunk = structural_ancestor_chunk
-
-            for chunk in sub_chunks:
-                if prepended_chunk:
-                    chunk = prepended_chunk + chunk
-                    prepended_chunk = None  # clear
-
-                if is_force_prepend_chunk(node):
-                    # Prepend list item markers and other force prepend chunks to the following chunk
-                    # without any trailing whitespace
-                    prepended_chunk = chunk
-                elif len(chunk.text) < min_text_length:
-                    # If chunk is less than min length, prepend with a line break
-                    chunk.text += "\n"
-                    prepended_chunk = chunk
-                else:
-                    if ancestor_chunk:
-                        # If an ancestor chunk is set, we always want it to be bigger than the current
-                        # chunk, yet sometimes due to prepended chunks, skip tags and length limits you
-                        # can get situations where the ancestor chunk found in the tree ends up being smaller
-                        # than the (perhaps concatenated and built up) current chunk. Fix that case here.
-                        if len(ancestor_chunk.text) > len(chunk.text):
-                            chunk.parent = ancestor_chunk
-                        else:
-                            # self-parent
-                            chunk.parent = chunk
-
-                    final_chunks.append(chunk)
+            yield sub_chunks, _build_ancestor_chunk(node, options, memo), is_force_prepend_chunk(node)
         else:
-            # Continue deeper in the tree
-            for child in node:
-                _traverse(child)
+            # Continue deeper in the tree (children are pushed in reverse to pop in document order)
+            under_structural = under_structural or is_structural(node)
+            stack.extend((child, in_included_tag, under_structural) for child in reversed(node))
+
+
+class _ChunkAssembler:
+    """
+    Merges the chunks of consecutive leaf nodes in document order: carrying small and force
+    prepend chunks over into the chunk that follows them and setting structure mode parents.
+    This is the only order dependent part of segmentation, so it always runs serially.
+    """
+
+    def __init__(self, min_text_length: int, emit: Callable[[Chunk], None]):
+        self.min_text_length = min_text_length
+        self.emit = emit
+        self.prepended_chunk: Optional[ChunkBuilder] = None
+        self.prepended_pieces: List[Chunk] = []  # the chunks merged into prepended_chunk, for fingerprints
+
+    def add_leaf(self, leaf: _LeafChunks):
+        sub_chunks, ancestor_chunk, force_prepend = leaf
+        for chunk in sub_chunks:
+            # Merges are accumulated in a builder and only materialized once the
+            # merged chunk is emitted, to avoid building every intermediate chunk
+            merged_chunk: Optional[ChunkBuilder] = None
+            merged_pieces = [chunk]
+            if self.prepended_chunk:
+                merged_chunk = self.prepended_chunk
+                merged_chunk.add(chunk)
+                merged_pieces = self.prepended_pieces
+                merged_pieces.append(chunk)
+                self.prepended_chunk = None  # clear
+                self.prepended_pieces = []
+
+            chunk_text_length = merged_chunk.text_length if merged_chunk else len(chunk.text)
+            if force_prepend:
+                # Prepend list item markers and other force prepend chunks to the following chunk
+                # without any trailing whitespace
+                self.prepended_chunk = merged_chunk or ChunkBuilder(chunk)
+                self.prepended_pieces = merged_pieces
+            elif chunk_text_length < self.min_text_length:
+                # If chunk is less than min length, prepend with a line break
+                self.prepended_chunk = merged_chunk or ChunkBuilder(chunk)
+                self.prepended_chunk.append_text("\n")
+                self.prepended_pieces = merged_pieces
+            else:
+                if merged_chunk:
+                    chunk = merged_chunk.build()
+                    _set_content_fingerprint(chunk, merged_pieces)
+                if ancestor_chunk:
+                    # If an ancestor chunk is set, we always want it to be bigger than the current
+                    # chunk, yet sometimes due to prepended chunks, skip tags and length limits you
+                    # can get situations where the ancestor chunk found in the tree ends up being smaller
+                    # than the (perhaps concatenated and built up) current chunk. Fix that case here.
+                    if len(ancestor_chunk.text) > len(chunk.text):
+                        chunk.parent = ancestor_chunk
+                    else:
+                        # self-parent
+                        chunk.parent = chunk
+
+                self.emit(chunk)
+
+    def finish(self):
+        # Append any remaining prepended_small_chunk that wasn't followed by a large chunk
+        if self.prepended_chunk:
+            chunk = self.prepended_chunk.build()
+            _set_content_fingerprint(chunk, self.prepended_pieces)
+            self.emit(chunk)
+            self.prepended_chunk = None
+            self.prepended_pieces = []
+
+
+class _WindowParents:
+    """
+    Sets window hierarchy mode parents as chunks are produced, keeping only a sliding buffer of
+    the last 2 * levels + 1 chunks, and passes each chunk on once its window is complete.
+    """
+
+    def __init__(self, levels: int, emit: Callable[[Chunk], None]):
+        self.levels = levels
+        self.emit = emit
+        self.window: Deque[Chunk] = deque()
+        self.current = 0  # position in window of the next chunk to get a parent
+
+    def _set_parent(self):
+        chunk = self.window[self.current]
+        parent_chunks = list(islice(self.window, max(0, self.current - self.levels), self.current + self.levels + 1))
+
+        parent = ChunkBuilder(parent_chunks[0])
+        for pc in parent_chunks[1:]:
+            parent.add(pc)
+        parent.parent = None  # window parents are context only, don't chain them
+        # Instead of default text add behaviour, add a newline
+        chunk.parent = parent.build(text_separator="\n")
+        _set_content_fingerprint(chunk.parent, parent_chunks)
+
+        self.emit(chunk)
+        self.current += 1
+        if self.current > self.levels:
+            self.window.popleft()
+            self.current -= 1
+
+    def push(self, chunk: Chunk):
+        self.window.append(chunk)
+        if len(self.window) - 1 - self.current >= self.levels:
+            self._set_parent()
+
+    def flush(self):
+        while self.current < len(self.window):
+            self._set_parent()
+
+
+def _worker_options(options) -> bytes:
+    """
+    Pickles segmentation options for worker processes, which unpickle them in their initializer.
+    Worker processes may be forked, which passes initializer arguments without pickling them, but
+    workers must not share the subtree cache of this process: its database connection can't be used
+    across processes, and its lock may be held by another thread at the time of the fork. A subtree
+    cache pickles to its settings (committing pending writes first), so each worker opens its own.
+    """
+    return pickle.dumps(options)
+
+
+def _worker_context(subtree_cache: Optional[SubtreeCache]):
+    """
+    Multiprocessing context to start worker processes with. Workers with a persistent subtree cache
+    are not forked, since a thread of this process may hold one of SQLite's internal locks at the
+    time of the fork (e.g. while looking up the same cache), and the forked worker would block on
+    it forever when it opens its own store.
+    """
+    if subtree_cache is None or subtree_cache.path is None:
+        return None  # the default start method
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+# Parsed document and options for the current section worker process
+_section_worker_state: Dict = {}
+
+
+def _init_section_worker(document: bytes, huge_tree: bool, options: bytes):
+    _section_worker_state["root"] = parse_dgml(document, huge_tree=huge_tree)
+    _section_worker_state["options"] = pickle.loads(options)
+
+
+def _segment_sections(sections: List[Tuple[List[int], bool]]) -> List[_LeafChunks]:
+    """Builds the leaf chunks of the given sections (child index paths from the document root) in a worker."""
+    root = _section_worker_state["root"]
+    options: _SegmentationOptions = _section_worker_state["options"]
+
+    leaves: List[_LeafChunks] = []
+    for path, in_included_tag in sections:
+        node = root
+        for index in path:
+            node = node[index]
+        spans = page_spans(node) if options.filters and options.filters.page_range else None
+        leaves.extend(_iter_leaves(node, options, spans, in_included_tag))
+    if options.subtree_cache is not None:
+        options.subtree_cache.flush()
+    return leaves
+
 
-    _traverse(node)
+def _node_path(node) -> List[int]:
+    """Child indexes leading from the document root to the given node."""
+    path = []
+    parent = node.getparent()
+    while parent is not None:
+        path.append(parent.index(node))
+        node, parent = parent, parent.getparent()
+    path.reverse()
+    return path
 
-    # Append any remaining prepended_small_chunk that wasn't followed by a large chunk
-    if prepended_chunk:
-        final_chunks.append(prepended_chunk)
 
+def _plan_sections(
+    roots: List, options: _SegmentationOptions, spans: Optional[Dict], min_sections: int
+) -> List[Tuple[List[int], bool]]:
+    """
+    Splits the traversal of the given roots into independent sections that can be segmented in
+    parallel, by expanding non-leaf sections into their children one tree level at a time until
+    there are at least min_sections (or nothing left to expand). Traversing a non-leaf node only
+    traverses its children, so this doesn't change the output.
+
+    Returns each section as its child index path from the document root and whether it is
+    inside an included tag, in document order.
+    """
+    filters = options.filters
+    sections = [(root, _node_path(root), False) for root in roots]
+    expanded = True
+    while expanded and len(sections) < min_sections:
+        expanded = False
+        next_sections = []
+        for node, path, in_included_tag in sections:
+            if not isinstance(node.tag, str) or is_chunk_leaf(node, sub_chunk_tables=options.sub_chunk_tables):
+                next_sections.append((node, path, in_included_tag))
+                continue
+
+            if filters:
+                if filters.prunes(node, spans):
+                    continue
+                in_included_tag = in_included_tag or filters.is_included_tag(node)
+
+            next_sections.extend((child, path + [i], in_included_tag) for i, child in enumerate(node))
+            expanded = True
+        sections = next_sections
+
+    return [(path, in_included_tag) for _, path, in_included_tag in sections]
+
+
+def iter_chunks(
+    node,
+    min_text_length=DEFAULT_MIN_TEXT_LENGTH,
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
+    sub_chunk_tables=DEFAULT_SUBCHUNK_TABLES,
+    include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
+    parent_hierarchy_levels=DEFAULT_PARENT_HIERARCHY_LEVELS,
+    hierarchy_mode=DEFAULT_HIERARCHY_MODE,
+    filters: Optional[SegmentationFilter] = None,
+    parallel_workers=DEFAULT_PARALLEL_WORKERS,
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    subtree_cache: Optional[SubtreeCache] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    table_row_chunks=DEFAULT_TABLE_ROW_CHUNKS,
+) -> Iterator[Chunk]:
+    """
+    Yields all structural chunks in the given node (or parsed document), as xml chunks, in document
+    order as they are finished. Takes the same options as get_chunks (apart from memory_budget), and
+    yields the same chunks without holding them all in memory.
+    """
+    document: Optional[ParsedDocument] = None
+    if isinstance(node, ParsedDocument):
+        document, node = node, node.root
+
+    options = _SegmentationOptions(
+        max_text_length=max_text_length,
+        whitespace_normalize_text=whitespace_normalize_text,
+        sub_chunk_tables=sub_chunk_tables,
+        include_xml_tags=include_xml_tags,
+        parent_hierarchy_levels=parent_hierarchy_levels,
+        hierarchy_mode=hierarchy_mode,
+        filters=filters,
+        subtree_cache=subtree_cache,
+        fingerprint_chunks=fingerprint_chunks,
+        table_row_chunks=table_row_chunks,
+    )
+
+    finished_chunks: Deque[Chunk] = deque()
+
+    finish_chunk: Callable[[Chunk], None] = finished_chunks.append
+    if fingerprint_chunks:
+        options_fingerprint = _options_fingerprint(min_text_length, options)
+
+        def _finish_fingerprinted_chunk(chunk: Chunk):
+            _set_fingerprints(chunk, options_fingerprint)
+            finished_chunks.append(chunk)
+
+        finish_chunk = _finish_fingerprinted_chunk
+
+    emit_chunk = finish_chunk
+    window_parents: Optional[_WindowParents] = None
     if hierarchy_mode == HierarchyMode.Window and parent_hierarchy_levels > 0:
         # Set parents for text chunks using flat window of before/after chunks
-        for i, current_chunk in enumerate(final_chunks):
-            parent_chunk_range_start = max(0, i - parent_hierarchy_levels)
-            parent_chunk_range_end = min(len(final_chunks), i + parent_hierarchy_levels + 1)
-            parent_chunks = final_chunks[parent_chunk_range_start:parent_chunk_range_end]
-            for pc in parent_chunks:
-                if not current_chunk.parent:
-                    current_chunk.parent = pc
-                else:
-                    parent_clone = deepcopy(current_chunk.parent)
-                    current_chunk.parent = parent_clone + pc
-                    # Instead of default text add behaviour, add a newline
-                    current_chunk.parent.text = parent_clone.text + "\n" + pc.text
+        window_parents = _WindowParents(parent_hierarchy_levels, emit=finish_chunk)
+        emit_chunk = window_parents.push
+
+    assembler = _ChunkAssembler(min_text_length, emit=emit_chunk)
+
+    roots = filters.roots(node) if filters else [node]
+    spans = None
+    if filters and filters.page_range:
+        if document:
+            spans = document.annotation("page_spans", lambda: page_spans(node))
+        else:
+            spans = {}
+            for root in roots:
+                spans.update(page_spans(root))
+
+    sections = []
+    if parallel_workers and parallel_workers > 1:
+        sections = _plan_sections(roots, options, spans, min_sections=parallel_workers * 8)
+    if len(sections) > 1:
+        # Send contiguous batches of sections, a few per worker to balance uneven section sizes
+        batch_size = -(-len(sections) // (parallel_workers * 4))
+        batches = [sections[i : i + batch_size] for i in range(0, len(sections), batch_size)]
+        # Serialized as UTF-8, since the default ASCII output escapes non-ASCII tag names into invalid XML
+        serialized = etree.tostring(node.getroottree(), encoding="utf-8")
+        with ProcessPoolExecutor(
+            max_workers=parallel_workers,
+            mp_context=_worker_context(subtree_cache),
+            initializer=_init_section_worker,
+            initargs=(serialized, huge_tree, _worker_options(options)),
+        ) as executor:
+            for leaves in executor.map(_segment_sections, batches):
+                for leaf in leaves:
+                    assembler.add_leaf(leaf)
+                    while finished_chunks:
+                        yield finished_chunks.popleft()
+    else:
+        for root in roots:
+            for leaf in _iter_leaves(root, options, spans, document=document):
+                assembler.add_leaf(leaf)
+                while finished_chunks:
+                    yield finished_chunks.popleft()
+
+    assembler.finish()
+    if subtree_cache is not None:
+        subtree_cache.flush()
+
+    if window_parents:
+        window_parents.flush()
+
+    yield from finished_chunks
+
+
+def get_chunks(
+    node,
+    min_text_length=DEFAULT_MIN_TEXT_LENGTH,
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
+    sub_chunk_tables=DEFAULT_SUBCHUNK_TABLES,
+    include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
+    parent_hierarchy_levels=DEFAULT_PARENT_HIERARCHY_LEVELS,
+    hierarchy_mode=DEFAULT_HIERARCHY_MODE,
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    filters: Optional[SegmentationFilter] = None,
+    parallel_workers=DEFAULT_PARALLEL_WORKERS,
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    subtree_cache: Optional[SubtreeCache] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    table_row_chunks=DEFAULT_TABLE_ROW_CHUNKS,
+) -> Sequence[Chunk]:
+    """
+    Returns all structural chunks in the given node, as xml chunks.
+
+    The node can also be a ParsedDocument (e.g. from a DocumentCache), to segment the same document
+    repeatedly without parsing it or redoing the precomputation that doesn't depend on options.
+
+    If filters are given, only the matching part of the tree is segmented (see SegmentationFilter).
+
+    If a memory budget (in bytes) is given, finished chunks beyond the budget are spilled to a
+    temporary file and the result is a lazy SpillingChunkList, with spill telemetry in its stats.
+
+    If more than one parallel worker is requested, the top-level sections of the document are
+    segmented in a process pool and stitched back together in document order. Carrying small
+    and list marker chunks over section boundaries, and window mode parents, are applied while
+    stitching, so the output is the same as for serial segmentation. Workers parse the document
+    again, with huge_tree as the parser setting (which must be on if it was needed to parse it).
+
+    If a subtree cache is given, the rendered text of subtrees is looked up in it by content, so
+    clauses repeated within or across documents are only rendered once (see SubtreeCache). Parallel
+    workers each get their own cache over the same persistent store, and are started with the
+    forkserver (or spawn) method if there is one, so scripts using them need a __main__ guard.
+
+    If fingerprint_chunks is set, each chunk's metadata gets stable fingerprints that don't depend
+    on where it is in the document: "content_fingerprint" for its own content, "options_fingerprint"
+    for the segmentation options, and "fingerprint" combining both with its parent's content. A
+    chunk with an unchanged fingerprint has the same text and parent text as before, so downstream
+    embedding caches can skip it. Fingerprints come from subtree hashes, not the chunk text.
+
+    If table_row_chunks is set, tables (without xml tags) too long for one chunk are split into
+    groups of whole rows that each fit, with the header rows repeated in every group, instead of
+    slicing the rendered table on the max length. Each group is its own chunk, with the bounding
+    boxes of its rows and the xpath of its first row.
+    """
+    final_chunks: Union[List[Chunk], SpillingChunkList] = SpillingChunkList(memory_budget) if memory_budget is not None else []
+    for chunk in iter_chunks(
+        node,
+        min_text_length=min_text_length,
+        max_text_length=max_text_length,
+        whitespace_normalize_text=whitespace_normalize_text,
+        sub_chunk_tables=sub_chunk_tables,
+        include_xml_tags=include_xml_tags,
+        parent_hierarchy_levels=parent_hierarchy_levels,
+        hierarchy_mode=hierarchy_mode,
+        filters=filters,
+        parallel_workers=parallel_workers,
+        huge_tree=huge_tree,
+        subtree_cache=subtree_cache,
+        fingerprint_chunks=fingerprint_chunks,
+        table_row_chunks=table_row_chunks,
+    ):
+        final_chunks.append(chunk)
     return final_chunks
 
 
 def get_chunks_str(
-    dgml: str,
+    dgml: Union[str, bytes],
     min_text_length=DEFAULT_MIN_TEXT_LENGTH,
     max_text_length=DEFAULT_MAX_TEXT_LENGTH,
     whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
@@ -217,8 +861,59 @@ def get_chunks_str(
     include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
     parent_hierarchy_levels=DEFAULT_PARENT_HIERARCHY_LEVELS,
     hierarchy_mode=DEFAULT_HIERARCHY_MODE,
-) -> List[Chunk]:
-    root = etree.fromstring(dgml)
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    filters: Optional[SegmentationFilter] = None,
+    parallel_workers=DEFAULT_PARALLEL_WORKERS,
+    subtree_cache: Optional[SubtreeCache] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    table_row_chunks=DEFAULT_TABLE_ROW_CHUNKS,
+) -> Sequence[Chunk]:
+    """Returns all structural chunks in the given DGML string (or raw bytes, which skips decoding)."""
+    root = parse_dgml(dgml, huge_tree=huge_tree)
+
+    return get_chunks(
+        node=root,
+        min_text_length=min_text_length,
+        max_text_length=max_text_length,
+        whitespace_normalize_text=whitespace_normalize_text,
+        sub_chunk_tables=sub_chunk_tables,
+        include_xml_tags=include_xml_tags,
+        parent_hierarchy_levels=parent_hierarchy_levels,
+        hierarchy_mode=hierarchy_mode,
+        memory_budget=memory_budget,
+        filters=filters,
+        parallel_workers=parallel_workers,
+        huge_tree=huge_tree,
+        subtree_cache=subtree_cache,
+        fingerprint_chunks=fingerprint_chunks,
+        table_row_chunks=table_row_chunks,
+    )
+
+
+def get_chunks_file(
+    source: DGMLFile,
+    min_text_length=DEFAULT_MIN_TEXT_LENGTH,
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
+    sub_chunk_tables=DEFAULT_SUBCHUNK_TABLES,
+    include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
+    parent_hierarchy_levels=DEFAULT_PARENT_HIERARCHY_LEVELS,
+    hierarchy_mode=DEFAULT_HIERARCHY_MODE,
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    filters: Optional[SegmentationFilter] = None,
+    parallel_workers=DEFAULT_PARALLEL_WORKERS,
+    subtree_cache: Optional[SubtreeCache] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    table_row_chunks=DEFAULT_TABLE_ROW_CHUNKS,
+) -> Sequence[Chunk]:
+    """
+    Returns all structural chunks in the given DGML file (a path, as a str or Path, or a binary file
+    object). Gzip and zstd compressed input is decompressed as it is streamed into the parser. Use
+    get_chunks_str for DGML content.
+    """
+    root = parse_dgml(Path(source) if isinstance(source, str) else source, huge_tree=huge_tree)
 
     return get_chunks(
         node=root,
@@ -229,4 +924,81 @@ def get_chunks_str(
         include_xml_tags=include_xml_tags,
         parent_hierarchy_levels=parent_hierarchy_levels,
         hierarchy_mode=hierarchy_mode,
+        memory_budget=memory_budget,
+        filters=filters,
+        parallel_workers=parallel_workers,
+        huge_tree=huge_tree,
+        subtree_cache=subtree_cache,
+        fingerprint_chunks=fingerprint_chunks,
+        table_row_chunks=table_row_chunks,
     )
+
+
+# Open archive, parser setting and segmentation options for the current archive worker process
+_archive_worker_state: Dict = {}
+
+
+def _init_archive_worker(archive: str, huge_tree: bool, options: bytes):
+    _archive_worker_state["archive"] = zipfile.ZipFile(archive)
+    _archive_worker_state["huge_tree"] = huge_tree
+    _archive_worker_state["options"] = pickle.loads(options)
+
+
+def _segment_archive_member(name: str) -> List[Chunk]:
+    """Parses and segments one document of the archive in a worker."""
+    root = parse_archive_member(_archive_worker_state["archive"], name, huge_tree=_archive_worker_state["huge_tree"])
+    return list(get_chunks(root, **_archive_worker_state["options"]))
+
+
+def iter_archive_chunks(
+    archive: Union[str, Path],
+    min_text_length=DEFAULT_MIN_TEXT_LENGTH,
+    max_text_length=DEFAULT_MAX_TEXT_LENGTH,
+    whitespace_normalize_text=DEFAULT_WHITESPACE_NORMALIZE_TEXT,
+    sub_chunk_tables=DEFAULT_SUBCHUNK_TABLES,
+    include_xml_tags=DEFAULT_INCLUDE_XML_TAGS,
+    parent_hierarchy_levels=DEFAULT_PARENT_HIERARCHY_LEVELS,
+    hierarchy_mode=DEFAULT_HIERARCHY_MODE,
+    huge_tree=DEFAULT_XML_PARSER_HUGE_TREE,
+    filters: Optional[SegmentationFilter] = None,
+    parallel_workers=DEFAULT_PARALLEL_WORKERS,
+    subtree_cache: Optional[SubtreeCache] = None,
+    fingerprint_chunks=DEFAULT_FINGERPRINT_CHUNKS,
+    table_row_chunks=DEFAULT_TABLE_ROW_CHUNKS,
+) -> Iterator[Tuple[str, Sequence[Chunk]]]:
+    """
+    Yields the member name and structural chunks of each DGML document in a zip archive (e.g. a
+    docset export), in archive order. Members are streamed from the archive into the parser without
+    being extracted, and may themselves be gzip or zstd compressed.
+
+    With parallel_workers, that many documents are parsed and segmented at once in worker processes
+    (each document serially within its worker), otherwise one document at a time.
+    """
+    options = dict(
+        min_text_length=min_text_length,
+        max_text_length=max_text_length,
+        whitespace_normalize_text=whitespace_normalize_text,
+        sub_chunk_tables=sub_chunk_tables,
+        include_xml_tags=include_xml_tags,
+        parent_hierarchy_levels=parent_hierarchy_levels,
+        hierarchy_mode=hierarchy_mode,
+        filters=filters,
+        subtree_cache=subtree_cache,
+        fingerprint_chunks=fingerprint_chunks,
+        table_row_chunks=table_row_chunks,
+    )
+
+    with zipfile.ZipFile(archive) as zip_file:
+        names = archive_members(zip_file)
+        if parallel_workers and parallel_workers > 1 and len(names) > 1:
+            with ProcessPoolExecutor(
+                max_workers=parallel_workers,
+                mp_context=_worker_context(subtree_cache),
+                initializer=_init_archive_worker,
+                initargs=(str(archive), huge_tree, _worker_options(options)),
+            ) as executor:
+                yield from zip(names, executor.map(_segment_archive_member, names))
+        else:
+            for name in names:
+                root = parse_archive_member(zip_file, name, huge_tree=huge_tree)
+                yield name, get_chunks(root, **options)  # type: ignore
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from dgml_utils.models import BoundingBox, Chunk
+
+GridCell = Tuple[int, int]
+
+
+def _rect_distance(bbox: BoundingBox, x: float, y: float) -> float:
+    """
+    Euclidean distance from a point to a bounding box, 0 if the point is inside.
+
+    >>> _rect_distance(BoundingBox(0, 0, 10, 10), 5, 5)
+    0.0
+    >>> _rect_distance(BoundingBox(0, 0, 10, 10), 13, 14)
+    5.0
+    """
+    dx = max(bbox.left - x, 0.0, x - bbox.right)
+    dy = max(bbox.top - y, 0.0, y - bbox.bottom)
+    return math.hypot(dx, dy)
+
+
+class _PageGrid:
+    """Uniform grid buckets over the bounding boxes on a single page."""
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: Dict[GridCell, List[Tuple[int, BoundingBox]]] = defaultdict(list)
+        self.min_cell: Optional[GridCell] = None
+        self.max_cell: Optional[GridCell] = None
+
+    def _cell_range(self, left: float, top: float, right: float, bottom: float) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return math.floor(left / size), math.floor(top / size), math.floor(right / size), math.floor(bottom / size)
+
+    def insert(self, chunk_index: int, bbox: BoundingBox):
+        x0, y0, x1, y1 = self._cell_range(bbox.left, bbox.top, bbox.right, bbox.bottom)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells[(cx, cy)].append((chunk_index, bbox))
+
+        if self.min_cell is None or self.max_cell is None:
+            self.min_cell, self.max_cell = (x0, y0), (x1, y1)
+        else:
+            self.min_cell = (min(self.min_cell[0], x0), min(self.min_cell[1], y0))
+            self.max_cell = (max(self.max_cell[0], x1), max(self.max_cell[1], y1))
+
+    def overlapping(self, left: float, top: float, right: float, bottom: float) -> Set[int]:
+        found: Set[int] = set()
+        if self.min_cell is None or self.max_cell is None:
+            return found
+
+        # Only cells between the populated min and max cells can hold boxes
+        x0, y0, x1, y1 = self._cell_range(left, top, right, bottom)
+        x0, y0 = max(x0, self.min_cell[0]), max(y0, self.min_cell[1])
+        x1, y1 = min(x1, self.max_cell[0]), min(y1, self.max_cell[1])
+        if x0 > x1 or y0 > y1:
+            return found
+
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            # Fewer populated cells than cells in range (e.g. a whole page query), check those instead
+            cells: Iterable[List[Tuple[int, BoundingBox]]] = (
+                entries for (cx, cy), entries in self.cells.items() if x0 <= cx <= x1 and y0 <= cy <= y1
+            )
+        else:
+            cells = (self.cells.get((cx, cy), ()) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1))
+        for entries in cells:
+            for chunk_index, bbox in entries:
+                if bbox.left <= right and bbox.right >= left and bbox.top <= bottom and bbox.bottom >= top:
+                    found.add(chunk_index)
+        return found
+
+    def _ring(self, center: GridCell, radius: int) -> Iterable[GridCell]:
+        cx, cy = center
+        if radius == 0:
+            yield center
+            return
+        for dx in range(-radius, radius + 1):
+            yield cx + dx, cy - radius
+            yield cx + dx, cy + radius
+        for dy in range(-radius + 1, radius):
+            yield cx - radius, cy + dy
+            yield cx + radius, cy + dy
+
+    def nearest(self, x: float, y: float, k: int) -> List[Tuple[float, int]]:
+        if self.min_cell is None or self.max_cell is None or k <= 0:
+            return []
+
+        # Rings are searched from the populated cell closest to the point, so points far off the page
+        # don't search the empty cells in between. Unseen boxes are still at least radius cells away.
+        center = (
+            min(max(math.floor(x / self.cell_size), self.min_cell[0]), self.max_cell[0]),
+            min(max(math.floor(y / self.cell_size), self.min_cell[1]), self.max_cell[1]),
+        )
+        max_radius = max(
+            abs(center[0] - self.min_cell[0]),
+            abs(center[0] - self.max_cell[0]),
+            abs(center[1] - self.min_cell[1]),
+            abs(center[1] - self.max_cell[1]),
+        )
+
+        best: Dict[int, float] = {}
+
+        def visit(entries: List[Tuple[int, BoundingBox]]):
+            for chunk_index, bbox in entries:
+                distance = _rect_distance(bbox, x, y)
+                if distance < best.get(chunk_index, math.inf):
+                    best[chunk_index] = distance
+
+        searched = 0
+        for radius in range(max_radius + 1):
+            if searched > len(self.cells):
+                # The rings so far held more cells than are populated (mostly empty), so visit those instead
+                for entries in self.cells.values():
+                    visit(entries)
+                break
+            for cell in self._ring(center, radius):
+                searched += 1
+                visit(self.cells.get(cell, ()))
+
+            # Anything not yet seen lies outside the rings searched so far, so is at
+            # least radius cells away. Stop once k candidates are closer than that.
+            if len(best) >= k:
+                kth = heapq.nsmallest(k, best.values())[-1]
+                if kth <= radius * self.cell_size:
+                    break
+
+        return heapq.nsmallest(k, ((distance, chunk_index) for chunk_index, distance in best.items()))
+
+
+class ChunkSpatialIndex:
+    """
+    Per-page grid index over chunk bounding boxes, for page-region queries like
+    "which chunks overlap this rectangle" or "which chunks are nearest to this point".
+
+    Coordinates use the same top-left origin as BoundingBox. Query results are
+    returned in chunk (document) order, except nearest() which is ordered by distance.
+
+    >>> chunks = [
+    ...     Chunk(tag='a', text='A', xml='', structure='', xpath='', bboxes=[BoundingBox(0, 0, 100, 50, 1)]),
+    ...     Chunk(tag='b', text='B', xml='', structure='', xpath='', bboxes=[BoundingBox(0, 60, 100, 110, 1)]),
+    ...     Chunk(tag='c', text='C', xml='', structure='', xpath='', bboxes=[BoundingBox(0, 0, 100, 50, 2)]),
+    ... ]
+    >>> index = ChunkSpatialIndex.from_chunks(chunks)
+    >>> [c.tag for c in index.query_rect(1, 50, 40, 60, 70)]
+    ['a', 'b']
+    >>> [c.tag for c in index.query_point(2, 10, 10)]
+    ['c']
+    >>> [c.tag for c in index.nearest(1, 50, 105, k=2)]
+    ['b', 'a']
+    """
+
+    def __init__(self, chunks: Sequence[Chunk], cell_size: Optional[float] = None):
+        self.chunks = chunks
+        self._pages: Dict[Optional[int], _PageGrid] = {}
+
+        boxes = [(i, bbox) for i, chunk in enumerate(chunks) for bbox in chunk.bboxes if not bbox.is_empty]
+        if cell_size is None:
+            cell_size = self._default_cell_size([bbox for _, bbox in boxes])
+        self.cell_size = cell_size
+
+        for chunk_index, bbox in boxes:
+            grid = self._pages.get(bbox.page)
+            if grid is None:
+                grid = self._pages[bbox.page] = _PageGrid(cell_size)
+            grid.insert(chunk_index, bbox)
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[Chunk], cell_size: Optional[float] = None) -> ChunkSpatialIndex:
+        """Bulk loads an index from segmentation output."""
+        return cls(chunks, cell_size=cell_size)
+
+    @staticmethod
+    def _default_cell_size(boxes: List[BoundingBox]) -> float:
+        """Picks a cell roughly the size of a typical box, so most boxes land in a handful of cells."""
+        if not boxes:
+            return 1.0
+        sizes = sorted(max(bbox.width, bbox.height) for bbox in boxes)
+        return max(sizes[len(sizes) // 2], 1.0)
+
+    @property
+    def pages(self) -> List[Optional[int]]:
+        return list(self._pages.keys())
+
+    def query_rect(self, page: Optional[int], left: float, top: float, right: float, bottom: float) -> List[Chunk]:
+        """Returns chunks with a bounding box on the given page that overlaps the given rectangle."""
+        grid = self._pages.get(page)
+        if grid is None:
+            return []
+        return [self.chunks[i] for i in sorted(grid.overlapping(left, top, right, bottom))]
+
+    def query_point(self, page: Optional[int], x: float, y: float) -> List[Chunk]:
+        """Returns chunks with a bounding box on the given page that contains the given point."""
+        return self.query_rect(page, x, y, x, y)
+
+    def nearest(self, page: Optional[int], x: float, y: float, k: int = 1) -> List[Chunk]:
+        """Returns up to k chunks on the given page closest to the given point, nearest first."""
+        grid = self._pages.get(page)
+        if grid is None:
+            return []
+        return [self.chunks[i] for _, i in grid.nearest(x, y, k)]
@@ -0,0 +1,136 @@
+import pickle
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import IO, Iterator, List, Optional, Sequence, Union, overload
+
+from dgml_utils.models import Chunk
+
+# Rough fixed per-object overhead (Chunk, its dict and list fields) on top of string payloads
+_CHUNK_OVERHEAD_BYTES = 256
+_BBOX_BYTES = 72
+
+
+def estimate_chunk_size(chunk: Chunk) -> int:
+    """
+    Estimates the memory held by a chunk, including its parent (unless it is its own parent).
+
+    >>> estimate_chunk_size(Chunk(tag='p', text='x' * 1000, xml='', structure='', xpath='')) > 1000
+    True
+    """
+    size = _CHUNK_OVERHEAD_BYTES
+    size += sys.getsizeof(chunk.text) + sys.getsizeof(chunk.xml) + sys.getsizeof(chunk.xpath)
+    size += _BBOX_BYTES * len(chunk.bboxes)
+    parent = chunk.parent
+    if parent is not None and parent is not chunk:
+        size += _CHUNK_OVERHEAD_BYTES + sys.getsizeof(parent.text) + sys.getsizeof(parent.xml)
+        size += _BBOX_BYTES * len(parent.bboxes)
+    return size
+
+
+@dataclass
+class SpillStats:
+    resident_chunks: int = 0  # chunks currently held in memory
+    resident_bytes: int = 0  # estimated memory held by resident chunks
+    spilled_chunks: int = 0  # chunks written to disk
+    spilled_bytes: int = 0  # bytes written to disk
+    spills: int = 0  # number of times the memory budget was reached
+
+
+class SpillingChunkList(Sequence[Chunk]):
+    """
+    Append-only sequence of chunks that stays under a memory budget by spilling the chunks
+    held in memory to an anonymous temporary file whenever the budget is reached. Spilled
+    chunks are read back lazily on access, so the sequence can be indexed and iterated like
+    the list returned by get_chunks.
+
+    >>> chunks = SpillingChunkList(memory_budget=1024)
+    >>> for i in range(10):
+    ...     chunks.append(Chunk(tag='p', text=str(i) * 100, xml='', structure='p', xpath=f'/p[{i + 1}]'))
+    >>> len(chunks), chunks[3].xpath, [c.text[0] for c in chunks[-3:]]
+    (10, '/p[4]', ['7', '8', '9'])
+    >>> chunks.stats.spilled_chunks > 0
+    True
+    >>> chunks.close()
+    """
+
+    def __init__(self, memory_budget: int, directory: Optional[str] = None):
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.stats = SpillStats()
+        self._file: Optional[IO[bytes]] = None
+        self._offsets: List[int] = []  # file offset of each spilled chunk
+        self._resident: List[Chunk] = []
+
+    def append(self, chunk: Chunk):
+        self._resident.append(chunk)
+        self.stats.resident_chunks += 1
+        self.stats.resident_bytes += estimate_chunk_size(chunk)
+        if self.stats.resident_bytes > self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        """Writes all chunks currently held in memory to disk."""
+        if not self._resident:
+            return
+
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.directory)
+
+        self._file.seek(0, 2)  # reads may have moved the position
+        start = self._file.tell()
+        for chunk in self._resident:
+            self._offsets.append(self._file.tell())
+            pickle.dump(chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.stats.spills += 1
+        self.stats.spilled_chunks += len(self._resident)
+        self.stats.spilled_bytes += self._file.tell() - start
+        self.stats.resident_chunks = 0
+        self.stats.resident_bytes = 0
+        self._resident = []
+
+    def _load(self, index: int) -> Chunk:
+        assert self._file is not None
+        self._file.seek(self._offsets[index])
+        return pickle.load(self._file)
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._resident)
+
+    @overload
+    def __getitem__(self, index: int) -> Chunk: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Chunk]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Chunk, List[Chunk]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+
+        spilled = len(self._offsets)
+        return self._load(index) if index < spilled else self._resident[index - spilled]
+
+    def __iter__(self) -> Iterator[Chunk]:
+        # Spilled chunks are stored back to back, so read them sequentially
+        for index in range(len(self._offsets)):
+            yield self._load(index)
+        yield from self._resident
+
+    def close(self):
+        """Releases the temporary file. Spilled chunks are no longer accessible afterwards."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._offsets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from lxml import etree
+
+from dgml_utils.config import DEFAULT_WHITESPACE_NORMALIZE_TEXT, STYLE_KEY
+from dgml_utils.conversions import clean_tag
+from dgml_utils.locators import child_xpath_qnames, xpath
+from dgml_utils.models import BoundingBox
+from dgml_utils.parsing import parse_dgml
+
+TAG_INDEX_FORMAT_VERSION = 1
+TAG_INDEX_SUFFIX = ".tags.json"
+
+
+@dataclass
+class TagOccurrence:
+    tag: str
+    xpath: str
+    start: int  # offset of the element's text in TagIndex.document_text
+    end: int
+    bboxes: List[BoundingBox] = field(default_factory=list)
+
+
+class TagIndex:
+    """
+    Index of every element in a DGML document by clean tag and xpath, built in one pass.
+
+    The text of each element is kept as a (start, end) span into the document text, which is
+    the whole document's text nodes joined the same way as text_node_to_text, so lookups never
+    need the parsed tree.
+
+    >>> root = parse_dgml(b'<dg:chunk xmlns:dg="urn:dg" xmlns:d="urn:d"><dg:chunk structure="p">Dated <d:Date>Jan 1</d:Date></dg:chunk>'
+    ...                   b'<dg:chunk structure="p"><d:Date>Feb 2</d:Date></dg:chunk></dg:chunk>')
+    >>> index = TagIndex.build(root)
+    >>> [index.text(o) for o in index.occurrences('Date')]
+    ['Jan 1', 'Feb 2']
+    >>> [o.tag for o in index.within('/dg:chunk/dg:chunk[1]')]
+    ['Date']
+    >>> index.text(index.get('/dg:chunk/dg:chunk[1]'))
+    'Dated Jan 1'
+    """
+
+    def __init__(self, document_text: str, occurrences: List[TagOccurrence], subtree_ends: List[int]):
+        self.document_text = document_text
+        self._occurrences = occurrences  # document order
+        self._subtree_ends = subtree_ends  # index one past the last descendant of each occurrence
+        self._by_xpath: Dict[str, int] = {}
+        self._by_tag: Dict[str, List[TagOccurrence]] = {}
+        for i, occurrence in enumerate(occurrences):
+            self._by_xpath[occurrence.xpath] = i
+            self._by_tag.setdefault(occurrence.tag, []).append(occurrence)
+
+    @classmethod
+    def build(cls, node) -> TagIndex:
+        """Builds an index over the given node and all its descendants."""
+        pieces: List[str] = []
+        piece_starts: List[int] = []  # offset of each piece in " ".join(pieces)
+        length = 0  # length of " ".join(pieces)
+
+        def _add_piece(text: Optional[str]):
+            nonlocal length
+            if text:
+                if pieces:
+                    length += 1  # joining space
+                piece_starts.append(length)
+                pieces.append(text)
+                length += len(text)
+
+        occurrences: List[TagOccurrence] = []
+        subtree_ends: List[int] = []
+        stack = []  # (occurrence index, pieces count at start, child qnames)
+
+        root_xpath = xpath(node)
+
+        for event, element in etree.iterwalk(node, events=("start", "end")):
+            if not isinstance(element.tag, str):
+                # Comments and processing instructions contribute only their tail text
+                if event == "end":
+                    _add_piece(element.tail)
+                continue
+
+            if event == "start":
+                if stack:
+                    parent_xpath = occurrences[stack[-1][0]].xpath
+                    element_xpath = f"{parent_xpath}/{stack[-1][2][element]}"
+                else:
+                    element_xpath = root_xpath
+
+                occurrences.append(
+                    TagOccurrence(
+                        tag=clean_tag(element),
+                        xpath=element_xpath,
+                        start=length,
+                        end=length,
+                        bboxes=BoundingBox.from_style(element.attrib.get(STYLE_KEY)),
+                    )
+                )
+                subtree_ends.append(0)
+                stack.append((len(occurrences) - 1, len(pieces), child_xpath_qnames(element)))
+                _add_piece(element.text)
+            else:
+                index, first_piece, _ = stack.pop()
+                occurrence = occurrences[index]
+                if len(pieces) > first_piece:
+                    occurrence.start = piece_starts[first_piece]
+                    occurrence.end = length
+                else:
+                    occurrence.start = occurrence.end = length
+                subtree_ends[index] = len(occurrences)
+                if stack:
+                    _add_piece(element.tail)
+
+        return cls(" ".join(pieces), occurrences, subtree_ends)
+
+    def __len__(self) -> int:
+        return len(self._occurrences)
+
+    @property
+    def tags(self) -> List[str]:
+        return list(self._by_tag.keys())
+
+    def occurrences(self, tag: str) -> List[TagOccurrence]:
+        """All occurrences of the given clean tag, in document order."""
+        return self._by_tag.get(tag, [])
+
+    def get(self, xpath: str) -> Optional[TagOccurrence]:
+        """The occurrence for the element at the given xpath (e.g. a Chunk.xpath), if any."""
+        index = self._by_xpath.get(xpath)
+        return None if index is None else self._occurrences[index]
+
+    def within(self, xpath: str) -> List[TagOccurrence]:
+        """All descendant occurrences of the element at the given xpath, in document order."""
+        index = self._by_xpath.get(xpath)
+        if index is None:
+            return []
+        return self._occurrences[index + 1 : self._subtree_ends[index]]
+
+    def text(self, occurrence: TagOccurrence, whitespace_normalize=DEFAULT_WHITESPACE_NORMALIZE_TEXT) -> str:
+        """Text of the given occurrence, same as text_node_to_text on the original element."""
+        text = self.document_text[occurrence.start : occurrence.end]
+        if whitespace_normalize:
+            text = " ".join(text.split()).strip()
+        return text
+
+    def save(self, path: Union[str, Path], source_stat: Optional[os.stat_result] = None):
+        """Writes the index as JSON, optionally stamped with the stat of its source document."""
+        data = {
+            "version": TAG_INDEX_FORMAT_VERSION,
+            "source": [source_stat.st_size, source_stat.st_mtime_ns] if source_stat else None,
+            "text": self.document_text,
+            "occurrences": [
+                [
+                    o.tag,
+                    o.xpath,
+                    o.start,
+                    o.end,
+                    end,
+                    [[b.left, b.top, b.right, b.bottom, b.page] for b in o.bboxes],
+                ]
+                for o, end in zip(self._occurrences, self._subtree_ends)
+            ],
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: Union[str, Path], source_stat: Optional[os.stat_result] = None) -> Optional[TagIndex]:
+        """
+        Reads an index written by save(). Returns None if it is missing, from another format
+        version, or (when source_stat is given) stale relative to its source document.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != TAG_INDEX_FORMAT_VERSION:
+            return None
+        if source_stat and data.get("source") != [source_stat.st_size, source_stat.st_mtime_ns]:
+            return None
+
+        occurrences = []
+        subtree_ends = []
+        for tag, occurrence_xpath, start, end, subtree_end, boxes in data["occurrences"]:
+            occurrences.append(TagOccurrence(tag, occurrence_xpath, start, end, [BoundingBox(*box) for box in boxes]))
+            subtree_ends.append(subtree_end)
+        return cls(data["text"], occurrences, subtree_ends)
+
+    @classmethod
+    def for_file(cls, dgml_path: Union[str, Path]) -> TagIndex:
+        """
+        Returns the index for a DGML file, persisted alongside it (e.g. "doc.xml" -> "doc.tags.json").
+        The document is only parsed if there is no up to date index next to it.
+        """
+        dgml_path = Path(dgml_path)
+        index_path = dgml_path.with_suffix(TAG_INDEX_SUFFIX)
+        source_stat = dgml_path.stat()
+
+        index = cls.load(index_path, source_stat=source_stat)
+        if index is None:
+            index = cls.build(parse_dgml(dgml_path))
+            index.save(index_path, source_stat=source_stat)
+        return index
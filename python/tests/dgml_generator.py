@@ -0,0 +1,122 @@
+"""Synthetic DGML documents of controlled shape, for scaling tests."""
+
+import random
+from dataclasses import dataclass
+from typing import List
+
+from lxml import etree
+
+DG_NS = "http://www.docugami.com/2021/dgml"
+DOCSET_NS = "http://www.docugami.com/2021/dgml/TaqiTest20231103/NDA"
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+
+_NSMAP = {"dg": DG_NS, "docset": DOCSET_NS, "xhtml": XHTML_NS}
+
+_WORDS = (
+    "agreement party parties confidential information disclosing receiving obligation term notice "
+    "shall may not any all such other including without limitation written consent business purpose"
+).split()
+
+
+@dataclass
+class DGMLShape:
+    sections: int = 1  # top-level sections, each with a heading and a paragraph
+    depth: int = 0  # dg:chunk nesting depth of a section chain, with a heading and paragraph per level
+    list_items: int = 0  # items in one flat list, each a lim marker plus a paragraph
+    lim_run: int = 0  # consecutive tiny lim chunks, all carried over into the paragraph after them
+    table_rows: int = 0  # rows in one table (with table_columns cells each)
+    table_columns: int = 4
+    words: int = 24  # words per paragraph
+    seed: int = 0
+
+
+class _Builder:
+    def __init__(self, shape: DGMLShape):
+        self.shape = shape
+        self.random = random.Random(shape.seed)
+        self.page = 1
+        self.top = 100.0
+
+    def text(self, words: int) -> str:
+        return " ".join(self.random.choice(_WORDS) for _ in range(words))
+
+    def style(self) -> str:
+        # Lay blocks out down the page, moving on to the next page when it is full
+        style = f"boundingBox:{{left: 100.0; top: {self.top}; width: 2000.0; height: 50.0; page: {self.page};}}"
+        self.top += 60.0
+        if self.top > 3000.0:
+            self.page += 1
+            self.top = 100.0
+        return style
+
+    def chunk(self, parent, structure: str, text: str = "", tag: str = f"{{{DG_NS}}}chunk"):
+        element = etree.SubElement(parent, tag, structure=structure, style=self.style())
+        element.text = text
+        element.tail = "\n"
+        return element
+
+    def paragraph(self, parent, structure: str = "p"):
+        element = self.chunk(parent, structure, self.text(self.shape.words // 2) + " ")
+        tagged = etree.SubElement(element, f"{{{DOCSET_NS}}}Party")
+        tagged.text = self.text(2)
+        tagged.tail = " " + self.text(self.shape.words - self.shape.words // 2 - 2)
+        return element
+
+    def section(self, parent, heading: str):
+        section = self.chunk(parent, "div")
+        self.chunk(section, "h1", heading)
+        self.paragraph(section)
+        return section
+
+    def build(self) -> etree._Element:
+        shape = self.shape
+        root = etree.Element(f"{{{DG_NS}}}chunk", nsmap=_NSMAP)
+        root.text = "\n"
+
+        for i in range(shape.sections):
+            self.section(root, f"Section {i + 1}")
+
+        parent = root
+        for level in range(shape.depth):
+            parent = self.section(parent, f"Level {level + 1}")
+
+        if shape.list_items:
+            items = self.chunk(root, "ol", tag=f"{{{DOCSET_NS}}}Obligations")
+            for i in range(shape.list_items):
+                item = self.chunk(items, "li", tag=f"{{{DOCSET_NS}}}Obligation")
+                self.chunk(item, "lim", f"{i + 1}.")
+                self.paragraph(item)
+
+        if shape.lim_run:
+            run = self.chunk(root, "div")
+            for i in range(shape.lim_run):
+                self.chunk(run, "lim", f"({i + 1})")
+            self.paragraph(run)
+
+        if shape.table_rows:
+            table = etree.SubElement(root, f"{{{XHTML_NS}}}table", style=self.style())
+            table.tail = "\n"
+            for _ in range(shape.table_rows):
+                row = etree.SubElement(table, f"{{{XHTML_NS}}}tr")
+                for _ in range(shape.table_columns):
+                    cell = etree.SubElement(row, f"{{{XHTML_NS}}}td")
+                    cell.text = self.text(3)
+
+        return root
+
+
+def generate_dgml(shape: DGMLShape) -> bytes:
+    """
+    Builds a DGML document of the given shape, deterministic for the shape's seed.
+
+    >>> from dgml_utils.segmentation import get_chunks_str
+    >>> chunks = get_chunks_str(generate_dgml(DGMLShape(sections=1, depth=1, list_items=2, table_rows=2)))
+    >>> [chunk.structure for chunk in chunks]
+    ['h1', 'p', 'h1 p', 'lim p', 'lim p', '']
+    """
+    return etree.tostring(_Builder(shape).build(), xml_declaration=True, encoding="utf-8")
+
+
+def scaled_shapes(base: DGMLShape, field: str, sizes: List[int]) -> List[DGMLShape]:
+    """Copies of the base shape with the given field set to each of the sizes."""
+    return [DGMLShape(**{**base.__dict__, field: size}) for size in sizes]
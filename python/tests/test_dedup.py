@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+
+from dgml_utils import dedup
+from dgml_utils.config import CANONICAL_ID_KEY, CHUNK_ID_KEY
+from dgml_utils.dedup import NearDuplicateIndex, minhash_signatures
+from dgml_utils.models import Chunk
+from dgml_utils.segmentation import get_chunks_file
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+
+def test_minhash_signatures_fallback(monkeypatch: pytest.MonkeyPatch):
+    if dedup.np is None:
+        pytest.skip("numpy is not installed")
+
+    chunks = get_chunks_file(TEST_DATA_DIR / "article/Jane Doe.xml")
+    texts = [chunk.text for chunk in chunks] + ["", "tiny"]
+    vectorized = minhash_signatures(texts)
+
+    monkeypatch.setattr(dedup, "np", None)
+    assert minhash_signatures(texts) == vectorized
+
+
+def test_near_duplicate_index_across_documents(tmp_path: Path):
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    index_path = tmp_path / "near_duplicates.json"
+
+    first = get_chunks_file(input_file)
+    index = NearDuplicateIndex()
+    first_ids = index.add(first, document_id="first")
+    assert [chunk.metadata[CANONICAL_ID_KEY] for chunk in first] == first_ids
+    assert all(chunk.metadata[CHUNK_ID_KEY].startswith("first/") for chunk in first)
+    index.save(index_path)
+
+    # A later run picks up the saved index and maps a slightly edited copy onto the first document
+    second = get_chunks_file(input_file)
+    for chunk in second:
+        if len(chunk.text) > 200:  # a small edit is a big change to a short chunk
+            chunk.text = chunk.text.replace("Jane Doe", "John Doe")
+
+    loaded = NearDuplicateIndex.load(index_path)
+    assert loaded is not None and len(loaded) == len(index)
+    second_ids = loaded.add(second, document_id="second")
+    assert len(loaded) == len(index)  # nothing new
+    for first_chunk, canonical_id in zip(first, second_ids):
+        assert canonical_id == first_chunk.metadata[CANONICAL_ID_KEY]
+
+
+def test_near_duplicate_index_threshold():
+    clause = (
+        "The Recipient shall hold and maintain the Confidential Information in strictest confidence "
+        "for the sole and exclusive benefit of the Disclosing Party."
+    )
+    index = NearDuplicateIndex(threshold=0.9)
+    signatures = minhash_signatures([clause, clause.replace("strictest", "strict"), "Signature: ______"])
+
+    assert index.find(signatures[0]) is None
+    index.add([Chunk(tag="p", text=clause, xml="", structure="p", xpath="")])
+    assert index.find(signatures[1]) == "0/0"
+    assert index.find(signatures[2]) is None
+
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_permutations=100, bands=16)
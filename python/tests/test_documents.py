@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from dgml_utils.config import HierarchyMode
+from dgml_utils.documents import DocumentCache, ParsedDocument
+from dgml_utils.filters import SegmentationFilter
+from dgml_utils.segmentation import get_chunks, get_chunks_file
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+SEGMENTATION_OPTIONS = [
+    dict(),
+    dict(include_xml_tags=True, parent_hierarchy_levels=2),
+    dict(hierarchy_mode=HierarchyMode.Structure, parent_hierarchy_levels=2, max_text_length=512),
+    dict(hierarchy_mode=HierarchyMode.Structure, parent_hierarchy_levels=1, fingerprint_chunks=True),
+    dict(min_text_length=0, filters=SegmentationFilter(page_range=(1, 1))),
+]
+
+
+def test_parsed_document_matches_file():
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    document = ParsedDocument.parse(input_file)
+
+    # Segment the same document with options in turn, reusing what was computed for earlier options
+    for options in SEGMENTATION_OPTIONS + SEGMENTATION_OPTIONS:
+        expected = get_chunks_file(input_file, **options)
+        actual = get_chunks(document, **options)
+        assert [c.text for c in actual] == [c.text for c in expected]
+        assert [c.xpath for c in actual] == [c.xpath for c in expected]
+        assert [c.parent.text if c.parent else None for c in actual] == [c.parent.text if c.parent else None for c in expected]
+        assert [c.metadata for c in actual] == [c.metadata for c in expected]
+
+
+def test_document_cache_keys(tmp_path: Path):
+    input_file = tmp_path / "document.xml"
+    input_file.write_bytes((TEST_DATA_DIR / "fake/fake.xml").read_bytes())
+    cache = DocumentCache()
+
+    document = cache.get(input_file)
+    assert cache.get(input_file) is document
+    assert cache.get(input_file.read_bytes()) is not document  # keyed by content, not path
+    assert cache.get(input_file.read_text(encoding="utf-8")) is cache.get(input_file.read_bytes())
+
+    # A changed file is parsed again
+    stat = os.stat(input_file)
+    os.utime(input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.get(input_file) is not document
+    assert cache.stats.hits == 3 and cache.stats.misses == 3
+    assert len(cache) == 3
+
+
+def test_document_cache_eviction():
+    documents = [f'<chunk structure="p">Document {i}</chunk>'.encode() for i in range(4)]
+    size = ParsedDocument.parse(documents[0]).size
+    cache = DocumentCache(max_bytes=2 * size)
+
+    first = cache.get(documents[0])
+    cache.get(documents[1])
+    assert cache.get(documents[0]) is first  # now most recently used
+    cache.get(documents[2])
+    assert documents[0] in cache and documents[1] not in cache
+    assert cache.stats.evictions == 1 and cache.size == 2 * size
+
+    too_big = DocumentCache(max_bytes=size - 1)
+    too_big.get(documents[3])
+    assert len(too_big) == 0 and too_big.size == 0
+
+
+def test_document_cache_annotation_sizes():
+    documents = [(TEST_DATA_DIR / name).read_bytes() for name in ["article/Jane Doe.xml", "fake/fake.xml"]]
+    tree_sizes = [ParsedDocument.parse(dgml).size for dgml in documents]
+    cache = DocumentCache(max_bytes=sum(tree_sizes))
+
+    first = cache.get(documents[0])
+    get_chunks(first, parent_hierarchy_levels=2, hierarchy_mode=HierarchyMode.Structure, fingerprint_chunks=True)
+    assert first.tree_size == tree_sizes[0] and first.annotations_size > 0
+    assert first.size == first.tree_size + first.annotations_size
+
+    # The annotations of the first document no longer leave room for the second one
+    cache.get(documents[1])
+    assert documents[0] not in cache and documents[1] in cache
+    assert cache.stats.evictions == 1 and cache.size == tree_sizes[1]
+
+
+@pytest.mark.parametrize("hierarchy_mode", list(HierarchyMode))
+def test_document_cache_threads(hierarchy_mode: HierarchyMode):
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    expected = [c.text for c in get_chunks_file(input_file, parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode)]
+    cache = DocumentCache()
+
+    def segment(_):
+        chunks = get_chunks(cache.get(input_file), parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode)
+        return [c.text for c in chunks]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(segment, range(8)))
+    assert all(result == expected for result in results)
+    assert len(cache) == 1
+    assert cache.stats.hits + cache.stats.misses == 8
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+
+from dgml_utils.config import HierarchyMode
+from dgml_utils.parsing import parse_dgml
+from dgml_utils.segmentation import get_chunks, iter_chunks
+
+pa = pytest.importorskip("pyarrow")
+
+from dgml_utils.export import chunks_to_table, write_chunks  # noqa: E402
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+
+def test_chunks_to_table():
+    root = parse_dgml(TEST_DATA_DIR / "article/Jane Doe.xml")
+    chunks = get_chunks(root, parent_hierarchy_levels=2, hierarchy_mode=HierarchyMode.Structure)
+    table = chunks_to_table(chunks, batch_size=16)
+
+    assert table.num_rows == len(chunks)
+    assert table.column("text").to_pylist() == [c.text for c in chunks]
+    assert table.column("xpath").to_pylist() == [c.xpath for c in chunks]
+    assert table.column("parent_text").to_pylist() == [c.parent.text if c.parent else None for c in chunks]
+    assert table.column("parent_index").to_pylist() == [i if c.parent is c else None for i, c in enumerate(chunks)]
+
+    bboxes = table.column("bboxes").to_pylist()
+    for chunk, row in zip(chunks, bboxes):
+        assert [(b["left"], b["top"], b["right"], b["bottom"], b["page"]) for b in row] == [
+            (b.left, b.top, b.right, b.bottom, b.page) for b in chunk.bboxes
+        ]
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_write_chunks_streaming(tmp_path, format):
+    root = parse_dgml(TEST_DATA_DIR / "article/Shorebucks LLC_AZ.xml")
+    expected = get_chunks(root)
+
+    path = tmp_path / f"chunks.{format}"
+    rows = write_chunks(iter_chunks(root), path, format=format, batch_size=100)
+    assert rows == len(expected)
+
+    if format == "parquet":
+        import pyarrow.parquet as pq  # pyright: ignore[reportMissingImports]
+
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+    assert table.column("index").to_pylist() == list(range(len(expected)))
+    assert table.column("text").to_pylist() == [c.text for c in expected]
+
+
+def test_write_chunks_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        write_chunks([], tmp_path / "chunks.csv", format="csv")
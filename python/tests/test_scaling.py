@@ -0,0 +1,174 @@
+import gc
+import math
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+from dgml_generator import DGMLShape, generate_dgml, scaled_shapes
+
+from dgml_utils.config import HierarchyMode
+from dgml_utils.models import Chunk
+from dgml_utils.parsing import parse_dgml
+from dgml_utils.segmentation import get_chunks
+
+# Exponent of the fitted operations ~ document size ** exponent curve above which segmentation counts as
+# super-linear. Operations are Python line events, which are deterministic, so the margin can be tight:
+# linear work fits at about 1.0 (less with fixed overheads), and the sibling scans that used to make
+# xpaths quadratic for wide lists fit at about 1.3 over these sizes.
+MAX_OPERATIONS_EXPONENT = 1.15
+
+# Shapes grown along one dimension at a time, with the sizes to count operations at
+OPERATION_AXES: Dict[str, Tuple[DGMLShape, str, List[int]]] = {
+    "wide document": (DGMLShape(sections=0), "sections", [50, 100, 200, 400]),
+    "deep nesting": (DGMLShape(sections=0), "depth", [50, 100, 200, 400]),
+    "wide list": (DGMLShape(sections=0), "list_items", [50, 100, 200, 400]),
+    "tiny lim chunks": (DGMLShape(sections=0), "lim_run", [250, 500, 1000, 2000]),
+    "huge table": (DGMLShape(sections=0), "table_rows", [50, 100, 200, 400]),
+    "long paragraphs": (DGMLShape(sections=4), "words", [1000, 2000, 4000, 8000]),
+}
+
+# Work done in C (serializing, searching the tree) isn't counted as operations, so the timed tests below
+# cover it too. Wall time is noisy even on an idle machine, so they only run when this is set.
+TIMED_TESTS_ENV = "DGML_UTILS_TIMED_SCALING_TESTS"
+
+# Exponent of the fitted time ~ volume ** exponent curve above which segmentation counts as super-linear,
+# where volume is the size of the document plus the size of the chunks and parents built (split chunks
+# each carry the xml of their whole node, so the output can grow faster than the document itself).
+MAX_SCALING_EXPONENT = 1.35
+
+# Shapes grown along one dimension at a time, with the sizes to time them at
+SCALING_AXES: Dict[str, Tuple[DGMLShape, str, List[int]]] = {
+    "wide document": (DGMLShape(sections=0), "sections", [100, 200, 400, 800]),
+    "deep nesting": (DGMLShape(sections=0), "depth", [100, 200, 400, 800]),
+    "wide list": (DGMLShape(sections=0), "list_items", [100, 200, 400, 800]),
+    "tiny lim chunks": (DGMLShape(sections=0), "lim_run", [500, 1000, 2000, 4000]),
+    "huge table": (DGMLShape(sections=0), "table_rows", [100, 200, 400, 800]),
+    "long paragraphs": (DGMLShape(sections=4), "words", [2000, 4000, 8000, 16000]),
+}
+
+SEGMENTATION_MODES = [
+    (HierarchyMode.Window, False),
+    (HierarchyMode.Window, True),
+    (HierarchyMode.Structure, False),
+    (HierarchyMode.Structure, True),
+]
+
+
+def _count_operations(function: Callable[[], object]) -> int:
+    """Number of Python line (and call and return) events while running the given function."""
+    count = 0
+
+    def trace(frame, event, arg):
+        nonlocal count
+        count += 1
+        return trace
+
+    previous = sys.gettrace()
+    sys.settrace(trace)
+    try:
+        function()
+    finally:
+        sys.settrace(previous)
+    return count
+
+
+def _segmentation_operations(documents: List[bytes], hierarchy_mode: HierarchyMode, include_xml_tags: bool) -> List[int]:
+    operations = []
+    for dgml in documents:
+        root = parse_dgml(dgml, huge_tree=True)  # deep nesting is over the default depth limit
+        operations.append(
+            _count_operations(
+                lambda root=root: get_chunks(
+                    root, parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode, include_xml_tags=include_xml_tags
+                )
+            )
+        )
+    return operations
+
+
+def _segmentation_times(
+    documents: List[bytes], hierarchy_mode: HierarchyMode, include_xml_tags: bool, rounds=3
+) -> Tuple[List[float], List[int]]:
+    """
+    Best segmentation time of each document over a few rounds, and the volume of the document and
+    the chunks built from it. Each round times every document in turn, so a burst of noise from the
+    machine slows down one measurement of each size rather than all the measurements of one size.
+    Garbage collection is paused so its pauses don't add noise either.
+    """
+    roots = [parse_dgml(dgml, huge_tree=True) for dgml in documents]  # deep nesting is over the default depth limit
+    best = [math.inf] * len(roots)
+    chunks_per_document: List[List[Chunk]] = [[] for _ in roots]
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            for i, root in enumerate(roots):
+                start = time.perf_counter()
+                chunks_per_document[i] = get_chunks(
+                    root, parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode, include_xml_tags=include_xml_tags
+                )
+                best[i] = min(best[i], time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    volumes = []
+    for dgml, chunks in zip(documents, chunks_per_document):
+        # Chunks and parents shared by several chunks (e.g. structure mode ancestors) are only built once
+        volume = len(dgml)
+        built = set()
+        for chunk in chunks:
+            for built_chunk in [chunk, chunk.parent]:
+                if built_chunk is not None and id(built_chunk) not in built:
+                    built.add(id(built_chunk))
+                    volume += len(built_chunk.text) + len(built_chunk.xml)
+        volumes.append(volume)
+    return best, volumes
+
+
+def _scaling_exponent(volumes: List[int], times: List[float]) -> float:
+    """Least squares slope of log(time) (or operations) against log(volume)."""
+    xs = [math.log(volume) for volume in volumes]
+    ys = [math.log(t) for t in times]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def test_scaling_exponent():
+    assert _scaling_exponent([1, 2, 4], [3, 6, 12]) == pytest.approx(1.0)
+    assert _scaling_exponent([1, 2, 4], [3, 12, 48]) == pytest.approx(2.0)
+
+
+def test_count_operations():
+    def loop(n):
+        for _ in range(n):
+            pass
+
+    assert _count_operations(lambda: loop(200)) - _count_operations(lambda: loop(100)) >= 200
+
+
+@pytest.mark.parametrize("axis", list(OPERATION_AXES.keys()))
+@pytest.mark.parametrize("hierarchy_mode,include_xml_tags", SEGMENTATION_MODES)
+def test_segmentation_operations_scaling(axis: str, hierarchy_mode: HierarchyMode, include_xml_tags: bool):
+    base, field, sizes = OPERATION_AXES[axis]
+    documents = [generate_dgml(shape) for shape in scaled_shapes(base, field, sizes)]
+    operations = _segmentation_operations(documents, hierarchy_mode, include_xml_tags)
+
+    exponent = _scaling_exponent([len(dgml) for dgml in documents], operations)
+    assert (
+        exponent < MAX_OPERATIONS_EXPONENT
+    ), f"{axis}: operations {operations} for {field} {sizes} grow as document size ** {exponent:.2f}"
+
+
+@pytest.mark.skipif(not os.environ.get(TIMED_TESTS_ENV), reason=f"timing dependent, set {TIMED_TESTS_ENV}=1 to run")
+@pytest.mark.parametrize("axis", list(SCALING_AXES.keys()))
+@pytest.mark.parametrize("hierarchy_mode,include_xml_tags", SEGMENTATION_MODES)
+def test_segmentation_scaling(axis: str, hierarchy_mode: HierarchyMode, include_xml_tags: bool):
+    base, field, sizes = SCALING_AXES[axis]
+    documents = [generate_dgml(shape) for shape in scaled_shapes(base, field, sizes)]
+    times, volumes = _segmentation_times(documents, hierarchy_mode, include_xml_tags)
+
+    exponent = _scaling_exponent(volumes, times)
+    assert exponent < MAX_SCALING_EXPONENT, f"{axis}: times {times} for {field} {sizes} grow as volume ** {exponent:.2f}"
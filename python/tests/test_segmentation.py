@@ -1,8 +1,15 @@
+import gzip
+import re
+import sqlite3
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
 import pytest
 import yaml
+from tabulate import tabulate
+from lxml import etree
 
 from dgml_utils.config import DEFAULT_HIERARCHY_MODE, DEFAULT_MAX_TEXT_LENGTH, HierarchyMode
 from dgml_utils.segmentation import (
@@ -10,9 +17,15 @@ from dgml_utils.segmentation import (
     DEFAULT_SUBCHUNK_TABLES,
     DEFAULT_INCLUDE_XML_TAGS,
     DEFAULT_PARENT_HIERARCHY_LEVELS,
+    get_chunks_file,
     get_chunks_str,
+    iter_archive_chunks,
 )
+from dgml_utils import conversions
+from dgml_utils.cache import SUBTREE_CACHE_FORMAT_VERSION, SubtreeCache
+from dgml_utils.filters import SegmentationFilter
 from dgml_utils.models import Chunk
+from dgml_utils.storage import SpillingChunkList
 
 
 @dataclass
@@ -133,10 +146,9 @@ def _debug_dump_yaml(chunks: List[Chunk], output_path: Optional[Path] = None):
 
 @pytest.mark.parametrize("test_data", SEGMENTATION_TEST_DATA)
 def test_segmentation(test_data: SegmentationTestData):
-    with open(test_data.input_file, "r", encoding="utf-8") as input_file:
-        article_shaped_file_xml = input_file.read()
-        chunks = get_chunks_str(
-            dgml=article_shaped_file_xml,
+    with open(test_data.input_file, "rb") as input_file:
+        chunks = get_chunks_file(
+            source=input_file,
             min_text_length=test_data.min_text_length,
             max_text_length=test_data.max_text_length,
             sub_chunk_tables=test_data.sub_chunk_tables,
@@ -168,3 +180,337 @@ def test_segmentation(test_data: SegmentationTestData):
             assert len(chunks) == len(
                 expected_chunks
             ), f"Length of chunks found in {test_data.input_file} does not match expected output file {test_data.output_file}"
+
+
+def test_segmentation_sources_match():
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    from_path = get_chunks_file(input_file)
+    from_bytes = get_chunks_str(input_file.read_bytes())
+    from_str = get_chunks_str(input_file.read_text(encoding="utf-8"))
+
+    assert [c.text for c in from_path] == [c.text for c in from_bytes] == [c.text for c in from_str]
+    assert [c.xpath for c in from_path] == [c.xpath for c in from_bytes] == [c.xpath for c in from_str]
+
+    # A str is a path for get_chunks_file, and DGML content for get_chunks_str
+    assert [c.text for c in get_chunks_file(str(input_file))] == [c.text for c in from_path]
+
+
+def test_segmentation_huge_tree():
+    dg = "xmlns:dg='http://www.docugami.com/2021/dgml'"
+    deep = f"<dg:chunk {dg}>" * 300 + f"<dg:chunk {dg} structure='p'>Deep text</dg:chunk>" + "</dg:chunk>" * 300
+    with pytest.raises(etree.XMLSyntaxError):
+        get_chunks_str(deep)  # libxml2 depth limits are on by default
+    assert [c.text for c in get_chunks_str(deep, huge_tree=True)] == ["Deep text"]
+
+
+def test_segmentation_compressed_sources(tmp_path: Path):
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    expected = [c.text for c in get_chunks_file(input_file)]
+
+    gzip_file = tmp_path / "Jane Doe.xml.gz"
+    gzip_file.write_bytes(gzip.compress(input_file.read_bytes()))
+    assert [c.text for c in get_chunks_file(gzip_file)] == expected
+    assert [c.text for c in get_chunks_str(gzip_file.read_bytes())] == expected
+    with open(gzip_file, "rb") as file:
+        assert [c.text for c in get_chunks_file(file)] == expected
+
+    zstandard = pytest.importorskip("zstandard")
+    zstd_file = tmp_path / "Jane Doe.xml.zst"
+    zstd_file.write_bytes(zstandard.ZstdCompressor().compress(input_file.read_bytes()))
+    assert [c.text for c in get_chunks_file(zstd_file)] == expected
+
+
+@pytest.mark.parametrize("parallel_workers", [None, 2])
+def test_segmentation_archive(tmp_path: Path, parallel_workers: Optional[int]):
+    input_files = [TEST_DATA_DIR / "article/Jane Doe.xml", TEST_DATA_DIR / "fake/fake.xml"]
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("docs/", "")
+        zip_file.write(input_files[0], "docs/Jane Doe.xml")
+        zip_file.writestr("docs/fake.xml.gz", gzip.compress(input_files[1].read_bytes()))
+        zip_file.writestr("docs/README.txt", "not a document")
+
+    members = list(iter_archive_chunks(archive, parent_hierarchy_levels=2, parallel_workers=parallel_workers))
+    assert [name for name, _ in members] == ["docs/Jane Doe.xml", "docs/fake.xml.gz"]
+    for input_file, (_, chunks) in zip(input_files, members):
+        expected = get_chunks_file(input_file, parent_hierarchy_levels=2)
+        assert [c.text for c in chunks] == [c.text for c in expected]
+        assert [c.parent.text for c in chunks if c.parent] == [c.parent.text for c in expected if c.parent]
+
+    with pytest.raises(ValueError):
+        get_chunks_file(archive)
+
+
+@pytest.mark.parametrize("hierarchy_mode", list(HierarchyMode))
+def test_segmentation_memory_budget(hierarchy_mode: HierarchyMode):
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    in_memory = get_chunks_file(input_file, parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode)
+    spilled = get_chunks_file(input_file, parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode, memory_budget=16 * 1024)
+
+    assert isinstance(spilled, SpillingChunkList)
+    assert spilled.stats.spills > 0
+    assert 0 < spilled.stats.spilled_chunks < len(spilled)
+    assert spilled.stats.spilled_bytes > 0
+
+    assert len(spilled) == len(in_memory)
+    for expected, actual in zip(in_memory, spilled):
+        assert actual.text == expected.text
+        assert actual.xpath == expected.xpath
+        assert actual.bboxes == expected.bboxes
+        assert actual.parent and expected.parent
+        assert actual.parent.text == expected.parent.text
+    assert spilled[-1].text == in_memory[-1].text
+    spilled.close()
+
+
+def test_segmentation_filters():
+    fake_file = TEST_DATA_DIR / "fake/fake.xml"
+    all_chunks = get_chunks_file(fake_file, min_text_length=0)
+
+    section_xpath = "/dg:chunk/docset:ConfidentialityObligations"
+    section_chunks = get_chunks_file(fake_file, min_text_length=0, filters=SegmentationFilter(root_xpath=section_xpath))
+    assert [c.text for c in section_chunks] == [c.text for c in all_chunks if c.xpath.startswith(section_xpath)]
+
+    no_markers = get_chunks_file(
+        fake_file,
+        min_text_length=0,
+        filters=SegmentationFilter(include_tags=["Obligations"], exclude_structures=["lim"]),
+    )
+    assert [c.text for c in no_markers] == ["Item A", "Item B", "C"]
+
+    headings = get_chunks_file(fake_file, min_text_length=0, filters=SegmentationFilter(include_structures=["h1"]))
+    assert [c.text for c in headings] == [c.text for c in all_chunks if c.structure == "h1"]
+
+
+def test_segmentation_page_filter():
+    input_file = TEST_DATA_DIR / "article/Shorebucks LLC_AZ.xml"
+    all_chunks = get_chunks_file(input_file)
+    page_chunks = get_chunks_file(input_file, filters=SegmentationFilter(page_range=(3, 5)))
+
+    assert 0 < len(page_chunks) < len(all_chunks)
+    assert {bbox.page for chunk in page_chunks for bbox in chunk.bboxes} == {3, 4, 5}
+
+    page_texts = {c.text for c in page_chunks}
+    for chunk in all_chunks:
+        if chunk.bboxes and all(3 <= bbox.page <= 5 for bbox in chunk.bboxes):  # type: ignore
+            assert chunk.text in page_texts
+
+
+@pytest.mark.parametrize("test_data", SEGMENTATION_TEST_DATA)
+def test_segmentation_parallel(test_data: SegmentationTestData):
+    options = dict(
+        min_text_length=test_data.min_text_length,
+        max_text_length=test_data.max_text_length,
+        sub_chunk_tables=test_data.sub_chunk_tables,
+        include_xml_tags=test_data.include_xml_tags,
+        parent_hierarchy_levels=test_data.parent_hierarchy_levels,
+        hierarchy_mode=test_data.hierarchy_mode,
+    )
+    serial = get_chunks_file(test_data.input_file, **options)
+    parallel = get_chunks_file(test_data.input_file, parallel_workers=2, **options)
+
+    assert len(parallel) == len(serial)
+    for expected, actual in zip(serial, parallel):
+        assert actual.text == expected.text
+        assert actual.xml == expected.xml
+        assert actual.xpath == expected.xpath
+        assert actual.structure == expected.structure
+        assert actual.bboxes == expected.bboxes
+        assert (actual.parent is None) == (expected.parent is None)
+        if actual.parent and expected.parent:
+            assert actual.parent.text == expected.parent.text
+
+
+def test_segmentation_parallel_reparse():
+    dg = "xmlns:dg='http://www.docugami.com/2021/dgml' xmlns:docset='urn:docset'"
+    sections = "".join(
+        f"<dg:chunk structure='p'><docset:SigniĄcantResult>Result {i}</docset:SigniĄcantResult></dg:chunk>" for i in range(40)
+    )
+
+    # Workers re-parse the document, which must keep non-ASCII tag names intact
+    dgml = f"<dg:chunk {dg}>{sections}</dg:chunk>"
+    serial = get_chunks_str(dgml)
+    assert [c.text for c in get_chunks_str(dgml, parallel_workers=2)] == [c.text for c in serial]
+
+    # and needs the same parser setting as the caller for documents over the default limits
+    deep = f"<dg:chunk {dg}>" * 300 + sections + "</dg:chunk>" * 300
+    serial = get_chunks_str(deep, huge_tree=True)
+    assert [c.text for c in get_chunks_str(deep, huge_tree=True, parallel_workers=2)] == [c.text for c in serial]
+
+
+@pytest.mark.parametrize("test_data", SEGMENTATION_TEST_DATA)
+def test_segmentation_subtree_cache(test_data: SegmentationTestData, tmp_path: Path):
+    options = dict(
+        min_text_length=test_data.min_text_length,
+        max_text_length=test_data.max_text_length,
+        sub_chunk_tables=test_data.sub_chunk_tables,
+        include_xml_tags=test_data.include_xml_tags,
+        parent_hierarchy_levels=test_data.parent_hierarchy_levels,
+        hierarchy_mode=test_data.hierarchy_mode,
+    )
+    expected_chunks = get_chunks_file(test_data.input_file, **options)
+
+    cache_path = tmp_path / "subtrees.db"
+    with SubtreeCache(path=cache_path) as cache:
+        first = get_chunks_file(test_data.input_file, subtree_cache=cache, **options)
+        misses = cache.stats.misses
+        second = get_chunks_file(test_data.input_file, subtree_cache=cache, **options)
+        assert cache.stats.misses == misses  # everything rendered in the first run is reused
+
+    # A fresh cache over the same database starts warm
+    with SubtreeCache(path=cache_path) as cache:
+        persisted = get_chunks_file(test_data.input_file, subtree_cache=cache, **options)
+        assert cache.stats.misses == 0 and cache.stats.hits > 0
+
+    for chunks in [first, second, persisted]:
+        assert len(chunks) == len(expected_chunks)
+        for expected, actual in zip(expected_chunks, chunks):
+            assert actual.text == expected.text
+            assert actual.xml == expected.xml
+            assert actual.xpath == expected.xpath
+            assert actual.bboxes == expected.bboxes
+            assert (actual.parent is None) == (expected.parent is None)
+            if actual.parent and expected.parent:
+                assert actual.parent.text == expected.parent.text
+
+
+def test_subtree_cache_format_version(tmp_path: Path):
+    cache_path = tmp_path / "subtrees.db"
+    with SubtreeCache(path=cache_path) as cache:
+        cache.put(b"key", "Rendered text")
+    with SubtreeCache(path=cache_path) as cache:
+        assert cache.get(b"key") == "Rendered text"
+
+    # A store written by another version is cleared, since its renderings may be stale
+    db = sqlite3.connect(str(cache_path))
+    db.execute(f"PRAGMA user_version = {SUBTREE_CACHE_FORMAT_VERSION + 1}")
+    db.close()
+    with SubtreeCache(path=cache_path) as cache:
+        assert cache.get(b"key") is None
+        assert cache._format_version() == SUBTREE_CACHE_FORMAT_VERSION
+
+
+def test_segmentation_subtree_cache_across_documents():
+    # The two NTSB reports share boilerplate (form labels, headings), which is only rendered once
+    first_file, second_file = sorted((TEST_DATA_DIR / "tabular").glob("*.xml"))
+    cache = SubtreeCache()
+    get_chunks_file(first_file, subtree_cache=cache)
+    hits = cache.stats.hits
+    chunks = get_chunks_file(second_file, subtree_cache=cache)
+
+    assert cache.stats.hits > hits
+    assert [c.text for c in chunks] == [c.text for c in get_chunks_file(second_file)]
+
+
+def test_segmentation_subtree_cache_parallel(tmp_path: Path):
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    expected = [c.text for c in get_chunks_file(input_file, include_xml_tags=True)]
+
+    cache_path = tmp_path / "subtrees.db"
+    with SubtreeCache(path=cache_path) as cache:
+        cache.put(b"pending", "Not committed when the workers start")
+        # Workers open their own store, while another thread keeps using the shared cache
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            serial = executor.submit(get_chunks_file, input_file, subtree_cache=cache, include_xml_tags=True)
+            parallel = get_chunks_file(input_file, subtree_cache=cache, include_xml_tags=True, parallel_workers=4)
+            assert [c.text for c in serial.result()] == expected
+        assert [c.text for c in parallel] == expected
+
+    # What the workers rendered was persisted too
+    with SubtreeCache(path=cache_path) as cache:
+        assert cache.get(b"pending") is not None
+        get_chunks_file(input_file, subtree_cache=cache, include_xml_tags=True, parallel_workers=4)
+        get_chunks_file(input_file, subtree_cache=cache, include_xml_tags=True)
+        assert cache.stats.misses == 0
+
+
+@pytest.mark.parametrize("hierarchy_mode", [HierarchyMode.Structure, HierarchyMode.Window])
+def test_segmentation_fingerprints(hierarchy_mode: HierarchyMode):
+    input_file = TEST_DATA_DIR / "article/Jane Doe.xml"
+    options = dict(parent_hierarchy_levels=2, hierarchy_mode=hierarchy_mode, fingerprint_chunks=True)
+    chunks = get_chunks_file(input_file, **options)
+
+    fingerprints = [chunk.metadata["fingerprint"] for chunk in chunks]
+    assert len(set(fingerprints)) == len(fingerprints)
+    assert len({chunk.metadata["options_fingerprint"] for chunk in chunks}) == 1
+    assert fingerprints == [
+        chunk.metadata["fingerprint"] for chunk in get_chunks_file(input_file, parallel_workers=2, **options)
+    ]
+
+    # Fingerprints don't depend on position, so inserting a section at the start of the document
+    # only changes the fingerprints of chunks whose text or parent text changed
+    dgml = input_file.read_bytes()
+    root_end = dgml.index(b">", dgml.index(b"<dg:chunk")) + 1
+    shifted = get_chunks_str(
+        dgml[:root_end] + b'<dg:chunk structure="h1">A new first heading</dg:chunk>' + dgml[root_end:], **options
+    )
+    before = {chunk.metadata["fingerprint"]: chunk for chunk in chunks}
+    unchanged = [chunk for chunk in shifted if chunk.metadata["fingerprint"] in before]
+    assert len(unchanged) >= len(chunks) - 2 * 2 - 1  # at most the chunks near the new section get new parents
+    assert any(chunk.xpath != before[chunk.metadata["fingerprint"]].xpath for chunk in unchanged)
+    for chunk in unchanged:
+        previous = before[chunk.metadata["fingerprint"]]
+        assert chunk.text == previous.text
+        assert (chunk.parent and chunk.parent.text) == (previous.parent and previous.parent.text)
+
+    # Different options give different fingerprints
+    other = get_chunks_file(input_file, max_text_length=DEFAULT_MAX_TEXT_LENGTH // 2, **options)
+    assert other[0].metadata["options_fingerprint"] != chunks[0].metadata["options_fingerprint"]
+    assert not set(fingerprints) & {chunk.metadata["fingerprint"] for chunk in other}
+
+
+def test_segmentation_table_row_chunks(monkeypatch: pytest.MonkeyPatch):
+    renders = []
+    monkeypatch.setattr(conversions, "tabulate", lambda *args, **kwargs: renders.append(args) or tabulate(*args, **kwargs))
+
+    # Tables that fit in one chunk are unchanged, and still rendered only once
+    for input_file in (TEST_DATA_DIR / "tabular").glob("*.xml"):
+        renders.clear()
+        expected = get_chunks_file(input_file)
+        expected_renders = len(renders)
+        assert [c.text for c in get_chunks_file(input_file, table_row_chunks=True)] == [c.text for c in expected]
+        assert len(renders) == 2 * expected_renders
+
+    # Including tables with header cells, which the row groups render but whole tables don't
+    small = (
+        '<dg:chunk xmlns:dg="http://www.docugami.com/2021/dgml" xmlns:xhtml="http://www.w3.org/1999/xhtml">'
+        '<xhtml:table structure="table"><xhtml:tr><xhtml:th>Name</xhtml:th><xhtml:th>Role</xhtml:th></xhtml:tr>'
+        "<xhtml:tr><xhtml:td>Alice</xhtml:td><xhtml:td>Author</xhtml:td></xhtml:tr></xhtml:table></dg:chunk>"
+    )
+    for options in [dict(), dict(parent_hierarchy_levels=1, hierarchy_mode=HierarchyMode.Structure)]:
+        expected = get_chunks_str(small, **options)
+        assert [c.text for c in get_chunks_str(small, table_row_chunks=True, **options)] == [c.text for c in expected]
+        assert "Alice" in expected[0].text and "Name" not in expected[0].text
+
+    rows = "".join(
+        f'<xhtml:tr style="boundingBox:{{left: 100; top: {100 + 50 * i}; width: 900; height: 40; page: {1 + i // 40};}}">'
+        f"<xhtml:td>Item {i}</xhtml:td><xhtml:td>{'word ' * (i % 7)}</xhtml:td></xhtml:tr>"
+        for i in range(100)
+    )
+    dgml = (
+        '<dg:chunk xmlns:dg="http://www.docugami.com/2021/dgml" xmlns:xhtml="http://www.w3.org/1999/xhtml">'
+        '<xhtml:table structure="table"><xhtml:thead><xhtml:tr><xhtml:th>Item</xhtml:th><xhtml:th>Description</xhtml:th>'
+        f"</xhtml:tr></xhtml:thead><xhtml:tbody>{rows}</xhtml:tbody></xhtml:table></dg:chunk>"
+    )
+    sliced = get_chunks_str(dgml, max_text_length=1024)
+    chunks = get_chunks_str(dgml, max_text_length=1024, table_row_chunks=True)
+
+    assert len(chunks) > 1
+    assert sum(len(c.text) for c in chunks) > sum(len(c.text) for c in sliced)  # headers are repeated
+    for chunk in chunks:
+        assert len(chunk.text) <= 1024
+        assert chunk.text.split("\n")[1].startswith("| Item ")
+        assert chunk.xml.count("<xhtml:tr") == chunk.text.count("| Item ")
+        assert chunk.xpath.startswith("/dg:chunk/xhtml:table/xhtml:tbody/xhtml:tr[")
+        assert chunk.bboxes and all(bbox.left == 100 and bbox.right == 1000 for bbox in chunk.bboxes)
+
+    # Every row is in exactly one chunk, whole and in order
+    items = [int(item) for c in chunks for item in re.findall(r"\| Item (\d+)", c.text)]
+    assert items == list(range(100))
+    assert chunks[0].xpath == "/dg:chunk/xhtml:table/xhtml:tbody/xhtml:tr[1]"
+
+    # Row boxes are joined on each page
+    for chunk in chunks:
+        pages = [bbox.page for bbox in chunk.bboxes]
+        assert len(pages) == len(set(pages))
+    assert {bbox.page for c in chunks for bbox in c.bboxes} == {1, 2, 3}
@@ -0,0 +1,89 @@
+import math
+import random
+from pathlib import Path
+
+from dgml_utils.models import BoundingBox, Chunk
+from dgml_utils.segmentation import get_chunks_file
+from dgml_utils.spatial import ChunkSpatialIndex
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+
+def _random_chunks(count: int, pages: int = 20, seed: int = 0):
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        page = rng.randint(1, pages)
+        left, top = rng.uniform(0, 2400), rng.uniform(0, 3200)
+        width, height = rng.uniform(5, 600), rng.uniform(5, 200)
+        chunks.append(
+            Chunk(
+                tag="p",
+                text=str(i),
+                xml="",
+                structure="p",
+                xpath="",
+                bboxes=[BoundingBox(left, top, left + width, top + height, page)],
+            )
+        )
+    return chunks
+
+
+def _overlaps(bbox: BoundingBox, left, top, right, bottom):
+    return bbox.left <= right and bbox.right >= left and bbox.top <= bottom and bbox.bottom >= top
+
+
+def _distance(bbox: BoundingBox, x, y):
+    return math.hypot(max(bbox.left - x, 0, x - bbox.right), max(bbox.top - y, 0, y - bbox.bottom))
+
+
+def test_spatial_index_matches_linear_scan():
+    chunks = _random_chunks(10_000)
+    index = ChunkSpatialIndex.from_chunks(chunks)
+    rng = random.Random(1)
+
+    for _ in range(200):
+        page = rng.randint(1, 20)
+        left, top = rng.uniform(0, 2400), rng.uniform(0, 3200)
+        right, bottom = left + rng.uniform(0, 400), top + rng.uniform(0, 400)
+
+        expected = [c for c in chunks if any(b.page == page and _overlaps(b, left, top, right, bottom) for b in c.bboxes)]
+        assert index.query_rect(page, left, top, right, bottom) == expected
+
+        expected_point = [c for c in chunks if any(b.page == page and _overlaps(b, left, top, left, top) for b in c.bboxes)]
+        assert index.query_point(page, left, top) == expected_point
+
+        nearest = index.nearest(page, left, top, k=5)
+        expected_distances = sorted(
+            min(_distance(b, left, top) for b in c.bboxes if b.page == page)
+            for c in chunks
+            if any(b.page == page for b in c.bboxes)
+        )[:5]
+        assert [min(_distance(b, left, top) for b in c.bboxes) for c in nearest] == expected_distances
+
+
+def test_spatial_index_far_queries():
+    # Queries far outside the boxes, or covering far more than them, only visit populated cells
+    chunks = _random_chunks(1_000, pages=1)
+    index = ChunkSpatialIndex.from_chunks(chunks)
+
+    assert index.query_rect(1, -1e12, -1e12, 1e12, 1e12) == chunks
+    assert index.query_rect(1, 1e12, 1e12, 2e12, 2e12) == []
+    for x, y in [(1e12, 1e12), (-1e12, 1600), (1200, -1e12), (5e4, 5e4)]:
+        nearest = index.nearest(1, x, y, k=5)
+        expected_distances = sorted(min(_distance(b, x, y) for b in c.bboxes) for c in chunks)[:5]
+        assert [min(_distance(b, x, y) for b in c.bboxes) for c in nearest] == expected_distances
+
+
+def test_spatial_index_on_segmented_document():
+    chunks = get_chunks_file(TEST_DATA_DIR / "article/Shorebucks LLC_AZ.xml")
+    index = ChunkSpatialIndex.from_chunks(chunks)
+
+    for chunk in chunks:
+        for bbox in chunk.bboxes:
+            center_x, center_y = (bbox.left + bbox.right) / 2, (bbox.top + bbox.bottom) / 2
+            assert chunk in index.query_point(bbox.page, center_x, center_y)
+            nearest = index.nearest(bbox.page, center_x, center_y)[0]
+            assert min(_distance(b, center_x, center_y) for b in nearest.bboxes if b.page == bbox.page) == 0
+
+    assert index.query_rect(9999, 0, 0, 10_000, 10_000) == []
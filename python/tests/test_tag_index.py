@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from dgml_utils.conversions import clean_tag, text_node_to_text
+from dgml_utils.locators import xpath
+from dgml_utils.models import BoundingBox
+from dgml_utils.parsing import parse_dgml
+from dgml_utils.segmentation import get_chunks
+from dgml_utils.tag_index import TagIndex
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+
+def test_tag_index_matches_tree():
+    for input_file in ["fake/fake.xml", "article/Jane Doe.xml", "tabular/20071204X01896.xml"]:
+        root = parse_dgml(TEST_DATA_DIR / input_file)
+        index = TagIndex.build(root)
+
+        elements = list(root.iter("{*}*"))
+        assert len(index) == len(elements)
+        for element in elements:
+            occurrence = index.get(xpath(element))
+            assert occurrence is not None
+            assert occurrence.tag == clean_tag(element)
+            assert index.text(occurrence) == text_node_to_text(element)
+            assert index.text(occurrence, whitespace_normalize=False) == text_node_to_text(element, whitespace_normalize=False)
+            assert occurrence.bboxes == BoundingBox.from_style(element.attrib.get("style"))
+            assert [o.xpath for o in index.within(occurrence.xpath)] == [xpath(e) for e in element.iterdescendants("{*}*")]
+
+
+def test_tag_index_within_chunks():
+    root = parse_dgml(TEST_DATA_DIR / "article/Jane Doe.xml")
+    index = TagIndex.build(root)
+
+    dates = index.occurrences("Date")
+    assert dates and all(o.tag == "Date" for o in dates)
+
+    for chunk in get_chunks(root):
+        if chunk.tag == "table":
+            continue  # rendered as a text table, so cell text is not contiguous
+        for occurrence in index.within(chunk.xpath):
+            assert index.text(occurrence) in chunk.text
+
+
+def test_tag_index_persisted_alongside_document(tmp_path):
+    dgml_path = tmp_path / "Jane Doe.xml"
+    dgml_path.write_bytes((TEST_DATA_DIR / "article/Jane Doe.xml").read_bytes())
+
+    built = TagIndex.for_file(dgml_path)
+    assert (tmp_path / "Jane Doe.tags.json").exists()
+
+    loaded = TagIndex.load(tmp_path / "Jane Doe.tags.json", source_stat=dgml_path.stat())
+    assert loaded is not None
+    assert loaded.tags == built.tags
+    for tag in built.tags:
+        assert loaded.occurrences(tag) == built.occurrences(tag)
+        assert [loaded.text(o) for o in loaded.occurrences(tag)] == [built.text(o) for o in built.occurrences(tag)]
+
+    # Stale once the source changes
+    dgml_path.write_bytes(dgml_path.read_bytes() + b"\n")
+    assert TagIndex.load(tmp_path / "Jane Doe.tags.json", source_stat=dgml_path.stat()) is None